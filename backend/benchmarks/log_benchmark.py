@@ -0,0 +1,117 @@
+"""
+Event-loop stall under log bursts: print() versus the queued logging pipeline.
+
+Run `python -m benchmarks.log_benchmark` from backend/ (see --help). A ticker
+task measures how late the event loop wakes it up while another task emits
+bursts of log lines.
+Output goes to a sink that sleeps on every write, standing in for a slow
+terminal or a log pipe whose reader has fallen behind. The report goes to
+stderr so it is not mixed with the benchmark's own output.
+"""
+import argparse
+import asyncio
+import io
+import logging
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+from utils import log
+
+
+class SlowSink(io.TextIOBase):
+    """Text stream that takes `delay` seconds per write"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        time.sleep(self.delay)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+async def measure(emit: Callable[[int], None], bursts: int, burst_size: int) -> List[float]:
+    """Emit bursts of log lines and return the event loop's wake-up lag samples in ms"""
+    lags: List[float] = []
+    done = asyncio.Event()
+    interval = 0.001
+
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lags.append(max(time.perf_counter() - expected, 0) * 1000)
+
+    async def producer():
+        for burst in range(bursts):
+            for i in range(burst_size):
+                emit(burst * burst_size + i)
+            # Let the ticker (and anything else) run between bursts
+            await asyncio.sleep(0.01)
+        done.set()
+
+    await asyncio.gather(ticker(), producer())
+    return lags
+
+
+def report(name: str, lags: List[float], elapsed: float):
+    ordered = sorted(lags)
+    p99 = ordered[int(len(ordered) * 0.99) - 1] if ordered else 0
+    print(
+        f"{name:8} ticks={len(lags):5}  p50={statistics.median(ordered):7.2f} ms  "
+        f"p99={p99:7.2f} ms  max={ordered[-1]:7.2f} ms  wall={elapsed:6.2f} s",
+        file=sys.stderr,
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare event-loop stall of print() and queued logging")
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--burst-size", type=int, default=200)
+    parser.add_argument("--write-delay-us", type=float, default=50, help="Simulated cost of one write to stdout")
+    args = parser.parse_args(argv)
+
+    sink = SlowSink(args.write_delay_us / 1_000_000)
+    real_stdout = sys.stdout
+
+    # Before: synchronous print() on the event loop
+    sys.stdout = sink
+    started = time.perf_counter()
+    lags = asyncio.run(measure(
+        lambda i: print(f"[Sync] Synced file {i}"),
+        args.bursts,
+        args.burst_size,
+    ))
+    report("print", lags, time.perf_counter() - started)
+
+    # After: records are queued and written by the listener thread.
+    # Rate limiting is disabled so both runs write every line.
+    log.settings.LOG_RATE_LIMIT_PER_SECOND = 0
+    log.settings.LOG_QUEUE_SIZE = args.bursts * args.burst_size
+    log.setup_logging()
+    logger = logging.getLogger("benchmark")
+    started = time.perf_counter()
+    lags = asyncio.run(measure(
+        lambda i: logger.info("Synced file %d", i),
+        args.bursts,
+        args.burst_size,
+    ))
+    loop_done = time.perf_counter() - started
+    log.stop_logging()
+    report("logging", lags, loop_done)
+    print(
+        f"         writer thread drained the queue {time.perf_counter() - started - loop_done:.2f} s "
+        f"after the loop finished; dropped={log.dropped_records()}",
+        file=sys.stderr,
+    )
+
+    sys.stdout = real_stdout
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,12 @@
+import itertools
+import time
+from typing import Dict, List, Optional
+from fastapi import Request, Response
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
 from config import settings
 
 engine = create_engine(settings.DATABASE_URL)
@@ -8,6 +14,94 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+
+class ReplicaPool:
+    """
+    Read replicas chosen round-robin. A replica that fails to hand out a
+    connection is skipped for REPLICA_RETRY_SECONDS before being tried again.
+    """
+
+    def __init__(self, urls: List[str]):
+        self.engines: List[Engine] = [create_engine(url, pool_pre_ping=True) for url in urls]
+        self._unhealthy_until: Dict[int, float] = {}
+        self._counter = itertools.count()
+
+    def healthy(self) -> List[Engine]:
+        now = time.monotonic()
+        return [e for i, e in enumerate(self.engines) if self._unhealthy_until.get(i, 0) <= now]
+
+    def candidates(self) -> List[Engine]:
+        """Healthy replicas, rotated so load spreads across them"""
+        healthy = self.healthy()
+        if not healthy:
+            return []
+        start = next(self._counter) % len(healthy)
+        return healthy[start:] + healthy[:start]
+
+    def mark_unhealthy(self, replica: Engine):
+        index = self.engines.index(replica)
+        self._unhealthy_until[index] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+
+
+replicas = ReplicaPool(settings.DATABASE_REPLICA_URLS)
+
+# Write responses carry the write time (Unix milliseconds) in this header;
+# clients echo it back so their next reads can see the write
+LAST_WRITE_HEADER = "X-Last-Write"
+
+
+def note_write(response: Response):
+    """
+    Stamp a write response with the time of the write. The client sends it
+    back, and its reads within READ_YOUR_WRITES_SECONDS go to the primary even
+    if the replicas lag behind, whichever worker serves them.
+    """
+    response.headers[LAST_WRITE_HEADER] = str(int(time.time() * 1000))
+
+
+def wrote_recently(request: Request) -> bool:
+    """Whether the request echoes a write made within READ_YOUR_WRITES_SECONDS"""
+    try:
+        last_write = int(request.headers.get(LAST_WRITE_HEADER, "")) / 1000
+    except ValueError:
+        return False
+    # Allow for clock skew between workers, but not a stamp far in the future
+    return abs(time.time() - last_write) < settings.READ_YOUR_WRITES_SECONDS
+
+
+def _replica_session() -> Optional[Session]:
+    for replica in replicas.candidates():
+        try:
+            connection = replica.connect()
+        except OperationalError:
+            replicas.mark_unhealthy(replica)
+            continue
+        return Session(bind=connection, autoflush=False)
+    return None
+
+
+def open_read_session(primary: bool = False) -> Session:
+    """
+    Session on a healthy read replica, falling back to the primary when no
+    replica is configured or reachable, or when `primary` is set (the caller
+    wrote recently). Close it with close_read_session().
+    """
+    db = None
+    if replicas.engines and not primary:
+        db = _replica_session()
+    if db is None:
+        db = SessionLocal()
+    return db
+
+
+def close_read_session(db: Session):
+    bind = db.bind
+    db.close()
+    if isinstance(bind, Connection):
+        # Replica sessions own their connection; return it to the pool
+        bind.close()
+
+
 # Dependency
 def get_db():
     db = SessionLocal()
@@ -15,3 +109,13 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Dependency for read-only routes
+def get_read_db(request: Request):
+    """Read session for the caller (see open_read_session)"""
+    db = open_read_session(wrote_recently(request))
+    try:
+        yield db
+    finally:
+        close_read_session(db)
@@ -2,16 +2,38 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import asyncio
+import logging
 from datetime import datetime, time
 from config import settings
-from database import Base, engine
-from routes import auth, templates, products
-from routes.templates import perform_sync, get_metadata
+from database import Base, LAST_WRITE_HEADER, engine
+from middleware import AdmissionMiddleware, CompressionMiddleware, ProfilingMiddleware, RequestIdMiddleware, admission_controller
+from migrations import run_migrations
+from routes import auth, templates, products, reviews, dashboard, debug
+from routes.templates import ensure_artifacts, perform_sync, get_metadata
 # Import models to ensure tables are created
 from models.otp import OTP  # noqa: F401
+from models.catalog import CatalogState  # noqa: F401
+from models.revoked_token import RevokedToken  # noqa: F401
+from models.facet import CategoryFacet  # noqa: F401
+from models.review import Review  # noqa: F401
+from models.catalog_event import CatalogEvent  # noqa: F401
+from utils.tokens import revocation_refresh_task
+from utils.google_auth import google_cert_cache
+from utils.images import image_proxy
+from utils.otp import otp_purge_task
+from utils.facets import facet_reconcile_task
+from utils.reviews import rating_recompute_task
+from utils.deals import deal_expiry_task
+from utils.catalog_events import catalog_event_task
+from utils.log import setup_logging, stop_logging
+from utils.profiling import route_profiler
 
-# Create database tables
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Create database tables, then bring existing ones up to date
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 
 # Background task for scheduled sync
 async def scheduled_sync_task():
@@ -30,43 +52,62 @@ async def scheduled_sync_task():
             next_run = now.replace(hour=6, minute=0, second=0, microsecond=0)
         
         wait_seconds = (next_run - now).total_seconds()
-        print(f"[Scheduler] Next GitHub sync scheduled at {next_run} ({wait_seconds:.0f} seconds from now)")
+        logger.info("Next GitHub sync scheduled at %s (%.0f seconds from now)", next_run, wait_seconds)
         
         await asyncio.sleep(wait_seconds)
         
         # Perform sync
-        print(f"[Scheduler] Starting scheduled GitHub sync at {datetime.now()}")
+        logger.info("Starting scheduled GitHub sync")
         try:
             await perform_sync()
             metadata = get_metadata()
-            print(f"[Scheduler] Sync completed. {metadata.get('file_count', 0)} files cached.")
-        except Exception as e:
-            print(f"[Scheduler] Sync failed: {e}")
+            logger.info("Sync completed. %d files cached.", metadata.get("file_count", 0))
+        except Exception:
+            logger.exception("Scheduled sync failed")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan - runs on startup and shutdown"""
     # Startup: Start the scheduled sync task
     sync_task = asyncio.create_task(scheduled_sync_task())
+    revocation_task = asyncio.create_task(revocation_refresh_task())
+    otp_purge = asyncio.create_task(otp_purge_task())
+    facet_reconcile = asyncio.create_task(facet_reconcile_task())
+    rating_recompute = asyncio.create_task(rating_recompute_task())
+    deal_expiry = asyncio.create_task(deal_expiry_task())
+    catalog_events = asyncio.create_task(catalog_event_task())
+    if settings.PROFILE_SAMPLING_INTERVAL_MS > 0:
+        route_profiler.start(settings.PROFILE_SAMPLING_INTERVAL_MS / 1000)
     
     # Also perform initial sync if not synced yet
     metadata = get_metadata()
     if metadata.get("status") != "synced":
-        print("[Startup] No cached data found. Performing initial sync...")
+        logger.info("No cached data found. Performing initial sync...")
         try:
             await perform_sync()
-            print("[Startup] Initial sync completed.")
-        except Exception as e:
-            print(f"[Startup] Initial sync failed: {e}")
+            logger.info("Initial sync completed.")
+        except Exception:
+            logger.exception("Initial sync failed")
+    else:
+        try:
+            await ensure_artifacts()
+        except Exception:
+            logger.exception("Building missing template artifacts failed")
     
     yield
     
-    # Shutdown: Cancel the background task
-    sync_task.cancel()
-    try:
-        await sync_task
-    except asyncio.CancelledError:
-        pass
+    # Shutdown: Cancel the background tasks
+    background_tasks = (sync_task, revocation_task, otp_purge, facet_reconcile, rating_recompute, deal_expiry, catalog_events)
+    for task in background_tasks:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    route_profiler.stop()
+    await google_cert_cache.close()
+    await image_proxy.close()
+    stop_logging()
 
 app = FastAPI(
     title="SaaS சந்தை API",
@@ -75,6 +116,14 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Sampling profiler (opt-in per request, or low-rate background sampling).
+# Innermost, so profiles cover the handler rather than time spent queued.
+app.add_middleware(ProfilingMiddleware)
+
+# Shed load per route class before it reaches the database or SMTP.
+# Added before CORS so it sits inside it and rejections still carry CORS headers.
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -82,12 +131,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Read by the frontend and echoed on later requests (read-your-writes)
+    expose_headers=[LAST_WRITE_HEADER],
 )
 
+# Compress large responses (precompressed payloads pass through untouched)
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+
+# Correlation IDs for logs; outermost so everything below logs with the ID
+app.add_middleware(RequestIdMiddleware)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(templates.router)
 app.include_router(products.router)
+app.include_router(reviews.router)
+app.include_router(dashboard.router)
+app.include_router(debug.router)
 
 @app.get("/")
 async def root():
@@ -100,3 +160,8 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+@app.get("/health/admission")
+async def admission_status():
+    """Per route class: running requests, queue depth and shed counts"""
+    return admission_controller.snapshot()
@@ -0,0 +1,7 @@
+# Middleware
+from .compression import CompressionMiddleware
+from .admission import AdmissionMiddleware, admission_controller
+from .request_id import RequestIdMiddleware
+from .profiling import ProfilingMiddleware
+
+__all__ = ["CompressionMiddleware", "AdmissionMiddleware", "admission_controller", "RequestIdMiddleware", "ProfilingMiddleware"]
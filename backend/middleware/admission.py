@@ -0,0 +1,171 @@
+import asyncio
+import json
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from config import settings
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Long-lived streams have their own connection cap and must not hold a slot
+EXEMPT_PATHS = ("/api/products/events",)
+
+
+class ConcurrencyLimiter:
+    """
+    At most `limit` requests run at once; up to `max_queue` more wait in FIFO
+    order for at most `timeout` seconds. Anything beyond that is rejected
+    straight away, so overload turns into fast rejections instead of latency.
+    """
+
+    def __init__(self, limit: int, max_queue: int, timeout: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    async def acquire(self) -> bool:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.shed += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() hands its slot straight to the waiter, so `active` is already counted
+            await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.admitted += 1
+        return True
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def snapshot(self) -> dict:
+        return {
+            "active": self.active,
+            "limit": self.limit,
+            "queued": len(self._waiters),
+            "queue_limit": self.max_queue,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+        }
+
+
+class AdmissionController:
+    """Maps requests to a route class and holds one limiter per class"""
+
+    def __init__(self, limits: Dict[str, int], max_queue: int, timeout: float):
+        self.limiters = {
+            route_class: ConcurrencyLimiter(limit, max_queue, timeout)
+            for route_class, limit in limits.items()
+        }
+
+    def classify(self, method: str, path: str) -> Optional[str]:
+        if path.startswith(EXEMPT_PATHS):
+            return None
+        if path.startswith("/api/auth"):
+            return "auth"
+        if path.startswith("/templates"):
+            return "templates"
+        if path.startswith("/api/products") and path.endswith("/image"):
+            # Uncached thumbnails wait on the image's origin; keep them off catalog slots
+            return "images"
+        if path.startswith(("/api/products", "/api/dashboard")):
+            return "catalog_reads" if method in READ_METHODS else "writes"
+        return None
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {route_class: limiter.snapshot() for route_class, limiter in self.limiters.items()}
+
+
+admission_controller = AdmissionController(
+    {
+        "auth": settings.ADMISSION_AUTH_CONCURRENCY,
+        "catalog_reads": settings.ADMISSION_CATALOG_READ_CONCURRENCY,
+        "writes": settings.ADMISSION_WRITE_CONCURRENCY,
+        "templates": settings.ADMISSION_TEMPLATES_CONCURRENCY,
+        "images": settings.ADMISSION_IMAGES_CONCURRENCY,
+    },
+    max_queue=settings.ADMISSION_QUEUE_SIZE,
+    timeout=settings.ADMISSION_QUEUE_TIMEOUT_MS / 1000,
+)
+
+
+class AdmissionMiddleware:
+    """
+    Per-route-class concurrency limits with bounded, deadline-limited wait
+    queues. Saturated classes answer 503 with Retry-After immediately. A slot
+    is held until the response starts, not until its body has been sent.
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController = admission_controller) -> None:
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        route_class = None
+        if scope["type"] == "http":
+            route_class = self.controller.classify(scope["method"], scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.controller.limiters[route_class]
+        if not await limiter.acquire():
+            await self._reject(send)
+            return
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                limiter.release()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # The handler is done; streaming the body (a file download, to a
+                # slow client) shouldn't keep the slot from the next request
+                release()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            release()
+
+    async def _reject(self, send: Send):
+        body = json.dumps({"detail": "Server is busy, please retry shortly"}).encode("utf-8")
+        headers: List[Tuple[bytes, bytes]] = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(settings.ADMISSION_RETRY_AFTER_SECONDS).encode("latin-1")),
+        ]
+        await send({"type": "http.response.start", "status": 503, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
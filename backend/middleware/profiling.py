@@ -0,0 +1,96 @@
+import asyncio
+import hmac
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import settings
+from utils.log import request_id_var
+from utils.profiling import STACK_ROOTS, Profile, Sampler, profile_store, route_of, route_profiler
+
+PROFILE_TOKEN_HEADER = b"x-profile-token"
+
+# The profile endpoints take the token too; don't profile them
+EXEMPT_PATHS = ("/debug",)
+
+
+def has_profile_token(scope: Scope) -> bool:
+    """Whether the request carries the profiling admin token"""
+    if not settings.PROFILE_TOKEN:
+        return False
+    for name, value in scope["headers"]:
+        if name == PROFILE_TOKEN_HEADER:
+            return hmac.compare_digest(value, settings.PROFILE_TOKEN.encode("utf-8"))
+    return False
+
+
+class ProfilingMiddleware:
+    """
+    Runs a request under the sampling profiler when it carries a valid
+    X-Profile-Token header; the profile is stored under the request ID,
+    returned in X-Profile-Id and served by /debug/profiles/{id}. While
+    background sampling is on, every request is registered with it too.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PATHS):
+            await self.app(scope, receive, send)
+            return
+        if has_profile_token(scope):
+            await self._profile(scope, receive, send)
+            return
+
+        sampler = route_profiler.sampler
+        if sampler is None:
+            await self.app(scope, receive, send)
+            return
+        task = asyncio.current_task()
+        sampler.add(task, scope, route_profiler.record)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            sampler.discard(task)
+
+    async def _profile(self, scope: Scope, receive: Receive, send: Send):
+        profile_id = request_id_var.get() or uuid.uuid4().hex
+        profile = Profile()
+        status_code = None
+
+        async def send_with_profile_id(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message)["X-Profile-Id"] = profile_id
+            await send(message)
+
+        sampler = Sampler(settings.PROFILE_INTERVAL_MS / 1000, threading.get_ident())
+        task = asyncio.current_task()
+        sampler.add(task, scope, lambda _, stack: profile.add(stack))
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.discard(task)
+            # Joining takes at most one sampling interval
+            sampler.stop()
+            profile_store.save(profile_id, {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route_of(scope),
+                "status_code": status_code,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "samples": profile.samples,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }, profile)
+
+
+STACK_ROOTS.update({ProfilingMiddleware.__call__.__code__, ProfilingMiddleware._profile.__code__})
@@ -0,0 +1,71 @@
+"""
+Minimal schema migrations.
+
+`Base.metadata.create_all` only creates missing tables; it never adds
+indexes or columns to tables that already exist. Each module listed in
+MIGRATIONS brings an existing database up to date and must be idempotent,
+because a fresh database created by `create_all` already has the objects.
+Applied versions are recorded in `schema_migrations`.
+"""
+import importlib
+import time
+from datetime import datetime
+from sqlalchemy import Column, DateTime, MetaData, String, Table, select
+from sqlalchemy.engine import Engine
+
+from utils.locks import try_advisory_lock
+
+# Applied in order; add new migrations to the end
+MIGRATIONS = [
+    "m0001_hot_query_indexes",
+    "m0002_otp_expiry_index",
+    "m0003_product_category_price_index",
+    "m0004_product_rating_total",
+    "m0005_product_deal_ends_at",
+    "m0006_seed_catalog_state",
+]
+
+MIGRATION_LOCK_NAME = "schema_migrations"
+LOCK_RETRY_SECONDS = 0.5
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", String(100), primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def run_migrations(engine: Engine) -> list:
+    """
+    Apply pending migrations and return the versions that were applied.
+
+    Every worker runs this at import, so it waits for the migration lock and
+    only then reads what has been applied: a worker that waited finds the
+    migrations another worker ran already recorded.
+    """
+    while True:
+        with try_advisory_lock(engine, MIGRATION_LOCK_NAME) as acquired:
+            if acquired:
+                return _apply_pending(engine)
+        time.sleep(LOCK_RETRY_SECONDS)
+
+
+def _apply_pending(engine: Engine) -> list:
+    _metadata.create_all(bind=engine)
+    applied = []
+    with engine.begin() as connection:
+        done = set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+    for version in MIGRATIONS:
+        if version in done:
+            continue
+        module = importlib.import_module(f"migrations.{version}")
+        with engine.begin() as connection:
+            module.upgrade(connection)
+            connection.execute(
+                schema_migrations.insert().values(version=version, applied_at=datetime.utcnow())
+            )
+        applied.append(version)
+    return applied
@@ -0,0 +1,17 @@
+"""Indexes for the marketplace ordering, "my products" and OTP lookups"""
+from sqlalchemy.engine import Connection
+from models.product import Product
+from models.otp import OTP
+
+INDEX_NAMES = {
+    Product.__table__: ["ix_products_created_by", "ix_products_created_at_id"],
+    OTP.__table__: ["ix_otps_user_used_expires"],
+}
+
+
+def upgrade(connection: Connection):
+    for table, names in INDEX_NAMES.items():
+        for index in table.indexes:
+            if index.name in names:
+                # checkfirst skips indexes create_all already made on fresh databases
+                index.create(bind=connection, checkfirst=True)
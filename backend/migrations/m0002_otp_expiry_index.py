@@ -0,0 +1,9 @@
+"""Index on otps.expires_at for the retention purge"""
+from sqlalchemy.engine import Connection
+from models.otp import OTP
+
+
+def upgrade(connection: Connection):
+    for index in OTP.__table__.indexes:
+        if index.name == "ix_otps_expires_at":
+            index.create(bind=connection, checkfirst=True)
@@ -0,0 +1,9 @@
+"""Index on products(category, price) for facet min/max recomputation"""
+from sqlalchemy.engine import Connection
+from models.product import Product
+
+
+def upgrade(connection: Connection):
+    for index in Product.__table__.indexes:
+        if index.name == "ix_products_category_price":
+            index.create(bind=connection, checkfirst=True)
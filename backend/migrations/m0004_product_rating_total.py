@@ -0,0 +1,9 @@
+"""Add products.rating_total, the running sum behind incremental ratings"""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(connection: Connection):
+    columns = {column["name"] for column in inspect(connection).get_columns("products")}
+    if "rating_total" not in columns:
+        connection.execute(text("ALTER TABLE products ADD COLUMN rating_total FLOAT NOT NULL DEFAULT 0"))
@@ -0,0 +1,31 @@
+"""Add products.deal_ends_at, the typed and indexed deal end time"""
+from datetime import datetime, timezone
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+from models.product import Product
+
+
+def upgrade(connection: Connection):
+    columns = {column["name"] for column in inspect(connection).get_columns("products")}
+    if "deal_ends_at" not in columns:
+        connection.execute(text("ALTER TABLE products ADD COLUMN deal_ends_at DATETIME NULL"))
+    for index in Product.__table__.indexes:
+        if index.name == "ix_products_deal_ends_at":
+            index.create(bind=connection, checkfirst=True)
+
+    # Carry over labels that already hold a timestamp; relative ones ("3 days")
+    # cannot be dated and stay as display text only
+    rows = connection.execute(text(
+        "SELECT id, deal_ends FROM products WHERE deal_ends IS NOT NULL AND deal_ends_at IS NULL"
+    )).fetchall()
+    for product_id, label in rows:
+        try:
+            ends_at = datetime.fromisoformat(label.strip())
+        except ValueError:
+            continue
+        if ends_at.tzinfo is not None:
+            ends_at = ends_at.astimezone(timezone.utc).replace(tzinfo=None)
+        connection.execute(
+            text("UPDATE products SET deal_ends_at = :ends_at WHERE id = :id"),
+            {"ends_at": ends_at, "id": product_id},
+        )
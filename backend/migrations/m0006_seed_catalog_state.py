@@ -0,0 +1,7 @@
+"""Create the catalog version row up front, so writes only ever UPDATE it"""
+from sqlalchemy.engine import Connection
+from models.catalog import seed_catalog_state
+
+
+def upgrade(connection: Connection):
+    connection.execute(seed_catalog_state(connection.dialect.name))
@@ -1,5 +1,9 @@
 # Models
 from .user import User
 from .product import Product
+from .catalog import CatalogState
+from .facet import CategoryFacet
+from .review import Review
+from .catalog_event import CatalogEvent
 
 __all__ = ["User"]
@@ -0,0 +1,47 @@
+from sqlalchemy import Column, Integer, DateTime
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.sql import func
+from sqlalchemy.orm import Session
+from database import Base
+
+
+class CatalogState(Base):
+    """Single-row table holding a version counter bumped on every catalog write"""
+    __tablename__ = "catalog_state"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+CATALOG_STATE_ID = 1
+
+
+def get_catalog_version(db: Session) -> int:
+    """Current catalog version (a primary-key lookup)"""
+    state = db.get(CatalogState, CATALOG_STATE_ID)
+    return state.version if state else 0
+
+
+def seed_catalog_state(dialect_name: str):
+    """INSERT of the version row at 0 that leaves an existing row as it is"""
+    if dialect_name == "mysql":
+        statement = mysql.insert(CatalogState).values(id=CATALOG_STATE_ID, version=0)
+        return statement.on_duplicate_key_update(id=statement.inserted.id)
+    return sqlite.insert(CatalogState).values(id=CATALOG_STATE_ID, version=0).on_conflict_do_nothing(
+        index_elements=["id"]
+    )
+
+
+def bump_catalog_version(db: Session):
+    """Increment the catalog version inside the caller's transaction"""
+    def increment() -> int:
+        return db.query(CatalogState).filter(
+            CatalogState.id == CATALOG_STATE_ID
+        ).update({"version": CatalogState.version + 1}, synchronize_session=False)
+
+    if not increment():
+        # The row is seeded by a migration; upsert it for a database that
+        # skipped it, so two first writes can't both insert it
+        db.execute(seed_catalog_state(db.get_bind().dialect.name))
+        increment()
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy.sql import func
+from database import Base
+
+
+class CatalogEvent(Base):
+    """
+    Outbox of catalog changes, written in the same transaction as the change.
+    Every worker polls it to feed its live event stream.
+    """
+    __tablename__ = "catalog_events"
+
+    # The catalog version the change produced; commits happen in version order
+    # because bumping the version locks the catalog_state row
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    event_type = Column(String(50), nullable=False)
+    # JSON event payload, sent to clients as-is
+    data = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
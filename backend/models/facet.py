@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime
+from sqlalchemy.sql import func
+from database import Base
+
+
+class CategoryFacet(Base):
+    """
+    Per-category marketplace aggregates, maintained incrementally by the
+    product write handlers and periodically reconciled against `products`.
+    """
+    __tablename__ = "category_facets"
+
+    category = Column(String(100), primary_key=True)
+    product_count = Column(Integer, nullable=False, default=0)
+    min_price = Column(Float, nullable=True)
+    max_price = Column(Float, nullable=True)
+    # JSON list of product counts, one per bucket in utils.facets.PRICE_BUCKETS
+    histogram = Column(Text, nullable=False, default="[]")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.sql import func
 from database import Base
 
@@ -11,3 +11,10 @@ class OTP(Base):
     expires_at = Column(DateTime(timezone=True), nullable=False)
     used = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # create_otp invalidates by (user_id, used); verify_otp adds expires_at
+        Index("ix_otps_user_used_expires", "user_id", "used", "expires_at"),
+        # Retention purge walks expired rows oldest-first
+        Index("ix_otps_expires_at", "expires_at"),
+    )
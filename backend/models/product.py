@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
@@ -16,12 +16,27 @@ class Product(Base):
     original_price = Column(Float, nullable=True)
     rating = Column(Float, default=5.0)
     review_count = Column(Integer, default=0)
+    # Running sum of review ratings; rating = rating_total / review_count
+    rating_total = Column(Float, nullable=False, default=0, server_default="0")
     image = Column(Text, nullable=True)
     badge = Column(String(50), nullable=True)
+    # Display label ("3 days"); the deal itself ends at deal_ends_at
     deal_ends = Column(String(50), nullable=True)
+    deal_ends_at = Column(DateTime(timezone=True), nullable=True)
     
     # Foreign key to users table
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        # "My products" lookup
+        Index("ix_products_created_by", "created_by"),
+        # Marketplace listing order (newest first)
+        Index("ix_products_created_at_id", "created_at", "id"),
+        # Facet min/max recomputation per category
+        Index("ix_products_category_price", "category", "price"),
+        # Active-deal listing and deal expiry scheduling
+        Index("ix_products_deal_ends_at", "deal_ends_at"),
+    )
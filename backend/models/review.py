@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.sql import func
+from database import Base
+
+
+class Review(Base):
+    __tablename__ = "reviews"
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    rating = Column(Integer, nullable=False)
+    comment = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        # One review per user per product
+        UniqueConstraint("product_id", "user_id", name="uq_reviews_product_user"),
+        # Keyset pagination (newest first) and rating recomputation
+        Index("ix_reviews_product_id_id", "product_id", "id"),
+        Index("ix_reviews_product_rating", "product_id", "rating"),
+    )
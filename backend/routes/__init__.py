@@ -1,4 +1,4 @@
 # Routes
-from . import auth, templates, products
+from . import auth, templates, products, reviews, dashboard, debug
 
 __all__ = ["auth"]
@@ -1,8 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
 from database import get_db
 from models.user import User
 from models.otp import OTP
@@ -10,9 +8,11 @@ from schemas.user import (
     UserCreate, UserResponse, Token, SignupResponse, 
     LoginResponse, OTPVerifyRequest, OTPResendRequest, GoogleAuthRequest
 )
-from utils.auth import get_password_hash, verify_password, create_access_token, get_current_user
+from utils.auth import get_password_hash, verify_password, create_user_token, get_current_user, get_current_principal
+from utils.tokens import TokenPrincipal, revocation_list
 from utils.otp import create_otp, verify_otp
 from utils.email import send_otp_email
+from utils.google_auth import google_token_verifier, GoogleCertsUnavailable
 from config import settings
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
@@ -117,7 +117,7 @@ async def verify_otp_endpoint(
         )
     
     # Create access token
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = create_user_token(user)
     
     return Token(
         access_token=access_token,
@@ -161,10 +161,9 @@ async def google_auth(
     Creates a new user if not exists, or logs in existing user.
     """
     try:
-        # Verify the Google ID token
-        idinfo = id_token.verify_oauth2_token(
+        # Verify the Google ID token against cached certs, off the event loop
+        idinfo = await google_token_verifier.verify(
             google_data.credential,
-            google_requests.Request(),
             settings.GOOGLE_CLIENT_ID
         )
         
@@ -203,7 +202,7 @@ async def google_auth(
             db.refresh(user)
         
         # Create access token - no OTP needed for Google Sign-In
-        access_token = create_access_token(data={"sub": user.email})
+        access_token = create_user_token(user)
         
         return Token(
             access_token=access_token,
@@ -211,6 +210,11 @@ async def google_auth(
             user=UserResponse.model_validate(user)
         )
         
+    except GoogleCertsUnavailable:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Google Sign-In is temporarily unavailable. Please try again."
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -220,3 +224,21 @@ async def google_auth(
 @router.get("/me", response_model=UserResponse)
 async def get_me(current_user: User = Depends(get_current_user)):
     return UserResponse.model_validate(current_user)
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    principal: TokenPrincipal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """
+    Revoke the current access token.
+    It is rejected immediately by this worker and by others on their next revocation refresh.
+    Tokens issued before token IDs existed can't be revoked and are refused with 400.
+    """
+    if not principal.jti:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="This token cannot be revoked; sign in again to get one that can"
+        )
+    revocation_list.revoke(db, principal.jti, principal.expires_at)
+    return None
@@ -0,0 +1,94 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+from typing import Dict, Tuple
+import asyncio
+import hashlib
+from database import open_read_session, close_read_session, wrote_recently
+from models.user import User
+from models.product import Product
+from schemas.user import UserResponse
+from schemas.product import ProductResponse
+from routes.products import marketplace_payload
+from routes.templates import sync_status
+from utils.auth import get_current_principal
+from utils.tokens import TokenPrincipal
+from utils.compression import CachedPayload, dump_json
+
+router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
+
+
+def _read_sections(primary: bool, principal: TokenPrincipal) -> Tuple[CachedPayload, CachedPayload, CachedPayload]:
+    """
+    The user, my-products and marketplace sections, read one after another on a
+    single pooled session (called in a worker thread), so a dashboard request
+    holds at most one connection.
+    """
+    db = open_read_session(primary)
+    try:
+        user = db.get(User, principal.id)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        my_products = db.query(Product).filter(Product.created_by == principal.id).all()
+        return (
+            CachedPayload(dump_json(jsonable_encoder(UserResponse.model_validate(user))), "application/json"),
+            CachedPayload(
+                dump_json(jsonable_encoder([ProductResponse.model_validate(p) for p in my_products])),
+                "application/json",
+            ),
+            marketplace_payload(db),
+        )
+    finally:
+        close_read_session(db)
+
+
+def _templates_status() -> CachedPayload:
+    return CachedPayload(dump_json(sync_status()), "application/json")
+
+
+@router.get("")
+async def get_dashboard(
+    request: Request,
+    principal: TokenPrincipal = Depends(get_current_principal)
+):
+    """
+    Everything the dashboard needs after login in one request: the user, their
+    products, the marketplace listing and the template sync status.
+
+    The database sections are read on one pooled session while the template
+    status is gathered alongside. Every section has its own ETag; send the
+    ones you hold in If-None-Match and unchanged sections come back as null
+    and are listed in `unchanged` (or the whole response is a 304 when
+    nothing changed).
+    """
+    primary = wrote_recently(request)
+    (user, my_products, products), templates_status = await asyncio.gather(
+        asyncio.to_thread(_read_sections, primary, principal),
+        asyncio.to_thread(_templates_status),
+    )
+    sections: Dict[str, CachedPayload] = {
+        "user": user,
+        "my_products": my_products,
+        "products": products,
+        "templates_status": templates_status,
+    }
+    etags = {name: payload.etag() for name, payload in sections.items()}
+    etag = '"' + hashlib.sha256("".join(etags.values()).encode("utf-8")).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    known = {tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")}
+    if etag in known or all(tag in known for tag in etags.values()):
+        return Response(status_code=304, headers=headers)
+
+    unchanged = [name for name, tag in etags.items() if tag in known]
+    # Splice the section bodies in as-is; the marketplace listing is already serialized
+    body = b'{"etags":' + dump_json(etags) + b',"unchanged":' + dump_json(unchanged)
+    for name, payload in sections.items():
+        body += b',"' + name.encode("utf-8") + b'":' + (b"null" if name in unchanged else payload.body)
+    body += b"}"
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse
+from middleware.profiling import has_profile_token
+from utils.profiling import profile_store, route_profiler
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+
+def require_profile_token(request: Request):
+    """Profiles expose code paths, so they need the profiling admin token"""
+    if not has_profile_token(request.scope):
+        # Don't reveal whether profiling is enabled
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+
+@router.get("/profiles", dependencies=[Depends(require_profile_token)])
+async def list_profiles():
+    """Stored per-request profiles, newest first"""
+    return {"profiles": profile_store.list()}
+
+
+@router.get("/profiles/routes", dependencies=[Depends(require_profile_token)])
+async def route_profiles():
+    """Background sampling status and sample counts per route"""
+    return route_profiler.summary()
+
+
+@router.get("/profiles/routes/folded", dependencies=[Depends(require_profile_token)])
+async def route_profile(route: str):
+    """Aggregated folded stacks for one route template, e.g. /api/products"""
+    profile = route_profiler.profiles.get(route)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No samples for this route")
+    return PlainTextResponse(profile.folded())
+
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_profile_token)])
+async def get_profile(profile_id: str):
+    """A request's folded stacks (feed to flamegraph.pl, inferno or speedscope)"""
+    stored = profile_store.get(profile_id)
+    if stored is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    _, profile = stored
+    return PlainTextResponse(profile.folded())
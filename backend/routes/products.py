@@ -1,39 +1,237 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
-from typing import List
-from database import get_db
+from typing import List, Optional
+from datetime import datetime
+import json
+import logging
+from config import settings
+from database import get_db, get_read_db, note_write, open_read_session, close_read_session
 from models.product import Product
-from models.user import User
-from schemas.product import ProductCreate, ProductUpdate, ProductResponse
-from routes.auth import get_current_user
+from models.catalog import get_catalog_version
+from schemas.product import ProductCreate, ProductUpdate, ProductResponse, FacetsResponse
+from utils import facets
+from utils.catalog_events import (
+    catalog_broadcaster, publish_product_event, PRODUCT_CREATED, PRODUCT_UPDATED, PRODUCT_DELETED
+)
+from utils.auth import get_current_principal
+from utils.tokens import TokenPrincipal
+from utils.compression import CachedPayload, payload_cache, payload_response, dump_json
+from utils.deals import deal_scheduler
+from utils.product_cache import get_product, get_products, product_cache
+from utils.images import THUMBNAIL_MEDIA_TYPE, THUMBNAIL_SIZES, ImageUnavailable, image_proxy
 
 router = APIRouter(prefix="/api/products", tags=["products"])
 
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRODUCT_IMAGE = "https://images.unsplash.com/photo-1557821552-17105176677c?w=400&h=200&fit=crop"
+
+
+def _check_deal_end(deal_ends_at: Optional[datetime]):
+    if deal_ends_at is not None and deal_ends_at <= datetime.utcnow():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Deal end time must be in the future"
+        )
+
+
+def _parse_ids(ids: str) -> List[int]:
+    """Product IDs from a comma-separated list, de-duplicated in order"""
+    try:
+        product_ids = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids must be a comma-separated list of product IDs"
+        )
+    if len(product_ids) > settings.PRODUCT_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.PRODUCT_BATCH_MAX_IDS} product IDs per request"
+        )
+    return product_ids
+
+
+def marketplace_payload(db: Session, active_deals: bool = False) -> CachedPayload:
+    """The marketplace listing (or its running deals), cached per catalog version"""
+    if active_deals:
+        # Soonest-ending first, straight off the deal_ends_at index
+        key = "products:active_deals"
+        query = db.query(Product).filter(
+            Product.deal_ends_at > datetime.utcnow()
+        ).order_by(Product.deal_ends_at)
+    else:
+        key = "products:all"
+        query = db.query(Product).order_by(Product.created_at.desc(), Product.id.desc())
+    
+    # Serialized and compressed once per catalog version, not per request.
+    # Expired deals bump the version, so the active-deal view stays current.
+    return payload_cache.get(
+        key,
+        get_catalog_version(db),
+        lambda: dump_json(jsonable_encoder(
+            [ProductResponse.model_validate(p) for p in query.all()]
+        )),
+    )
+
 
 @router.get("", response_model=List[ProductResponse])
-async def get_all_products(db: Session = Depends(get_db)):
-    """Get all products for marketplace"""
-    products = db.query(Product).all()
-    return products
+async def get_all_products(
+    request: Request,
+    active_deals: bool = False,
+    ids: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Get all products for marketplace, or only those with a running deal.
+    With `ids` (comma-separated), only those products, in that order;
+    unknown IDs are left out.
+    """
+    if ids is not None:
+        product_ids = _parse_ids(ids)
+        found = get_products(db, product_ids)
+        body = b"[" + b",".join(found[i] for i in product_ids if i in found) + b"]"
+        return Response(body, media_type="application/json")
+    return payload_response(marketplace_payload(db, active_deals), request.headers)
+
+
+@router.get("/facets", response_model=FacetsResponse)
+async def get_product_facets(request: Request, db: Session = Depends(get_read_db)):
+    """Per-category counts, price histograms and price range for marketplace filters"""
+    def build_facets() -> bytes:
+        categories = []
+        for facet in facets.get_facets(db):
+            counts = json.loads(facet.histogram)
+            categories.append({
+                "category": facet.category,
+                "count": facet.product_count,
+                "min_price": facet.min_price,
+                "max_price": facet.max_price,
+                "histogram": [
+                    {
+                        "min_price": lower,
+                        "max_price": facets.PRICE_BUCKETS[i + 1] if i + 1 < len(facets.PRICE_BUCKETS) else None,
+                        "count": counts[i],
+                    }
+                    for i, lower in enumerate(facets.PRICE_BUCKETS)
+                ],
+            })
+        min_prices = [c["min_price"] for c in categories if c["min_price"] is not None]
+        max_prices = [c["max_price"] for c in categories if c["max_price"] is not None]
+        return dump_json({
+            "total": sum(c["count"] for c in categories),
+            "min_price": min(min_prices) if min_prices else None,
+            "max_price": max(max_prices) if max_prices else None,
+            "categories": categories,
+        })
+    
+    payload = payload_cache.get("products:facets", get_catalog_version(db), build_facets)
+    return payload_response(payload, request.headers)
+
+
+@router.get("/events")
+async def get_catalog_events(
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    Server-Sent Events stream of product created/updated/deleted events.
+    Resumes after the Last-Event-ID header (or `last_event_id` query parameter).
+    """
+    if catalog_broadcaster.subscribers >= settings.CATALOG_EVENTS_MAX_SUBSCRIBERS:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many event stream connections"
+        )
+    
+    if last_event_id_header and last_event_id_header.isdigit():
+        last_event_id = int(last_event_id_header)
+    return StreamingResponse(
+        catalog_broadcaster.stream(last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/my", response_model=List[ProductResponse])
 async def get_my_products(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user: TokenPrincipal = Depends(get_current_principal)
 ):
     """Get products created by current user"""
     products = db.query(Product).filter(Product.created_by == current_user.id).all()
     return products
 
 
+@router.get("/{product_id}", response_model=ProductResponse)
+async def get_product_by_id(product_id: int, db: Session = Depends(get_read_db)):
+    """Get a single product"""
+    product = get_product(db, product_id)
+    if product is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+    return Response(product, media_type="application/json")
+
+
+@router.get("/{product_id}/image")
+async def get_product_image(request: Request, product_id: int, size: str = "card", v: Optional[str] = None):
+    """
+    The product's image as a WebP thumbnail, fetched from its origin on first
+    request and served from the local cache after that. With `v` (anything
+    that changes when the image does, e.g. updated_at) the response may be
+    cached for a year.
+    """
+    if size not in THUMBNAIL_SIZES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"size must be one of: {', '.join(THUMBNAIL_SIZES)}"
+        )
+    
+    # Don't hold a pooled connection while the origin is fetched
+    db = open_read_session()
+    try:
+        product = get_product(db, product_id)
+    finally:
+        close_read_session(db)
+    if product is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+    
+    source = json.loads(product)["image"] or DEFAULT_PRODUCT_IMAGE
+    try:
+        path, content_hash = await image_proxy.get_thumbnail(source, size)
+    except ImageUnavailable as e:
+        logger.warning("Image for product %d is unavailable: %s", product_id, e)
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="Product image is unavailable"
+        )
+    
+    headers = {
+        "Cache-Control": "public, max-age=31536000, immutable" if v else "public, max-age=3600",
+        "ETag": f'"{content_hash[:32]}-{size}"',
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if headers["ETag"] in {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, media_type=THUMBNAIL_MEDIA_TYPE, headers=headers)
+
+
 @router.post("", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
 async def create_product(
     product: ProductCreate,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: TokenPrincipal = Depends(get_current_principal)
 ):
     """Create a new product"""
+    _check_deal_end(product.deal_ends_at)
     db_product = Product(
         name=product.name,
         category=product.category,
@@ -41,16 +239,21 @@ async def create_product(
         description=product.description,
         price=product.price,
         original_price=product.original_price or product.price * 2,
-        image=product.image or "https://images.unsplash.com/photo-1557821552-17105176677c?w=400&h=200&fit=crop",
+        image=product.image or DEFAULT_PRODUCT_IMAGE,
         badge=product.badge,
         deal_ends=product.deal_ends,
+        deal_ends_at=product.deal_ends_at,
         rating=5.0,
         review_count=0,
         created_by=current_user.id
     )
     db.add(db_product)
+    facets.product_added(db, db_product.category, db_product.price)
+    publish_product_event(db, PRODUCT_CREATED, db_product)
     db.commit()
+    note_write(response)
     db.refresh(db_product)
+    deal_scheduler.schedule(db_product.id, db_product.deal_ends_at)
     return db_product
 
 
@@ -58,8 +261,9 @@ async def create_product(
 async def update_product(
     product_id: int,
     product: ProductUpdate,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: TokenPrincipal = Depends(get_current_principal)
 ):
     """Update a product"""
     db_product = db.query(Product).filter(Product.id == product_id).first()
@@ -76,20 +280,29 @@ async def update_product(
             detail="Not authorized to update this product"
         )
     
+    old_category, old_price = db_product.category, db_product.price
     update_data = product.model_dump(exclude_unset=True)
+    _check_deal_end(update_data.get("deal_ends_at"))
     for key, value in update_data.items():
         setattr(db_product, key, value)
     
+    facets.product_changed(db, old_category, old_price, db_product.category, db_product.price)
+    version = publish_product_event(db, PRODUCT_UPDATED, db_product)
     db.commit()
+    note_write(response)
+    product_cache.invalidate(product_id, version)
     db.refresh(db_product)
+    if "deal_ends_at" in update_data:
+        deal_scheduler.schedule(db_product.id, db_product.deal_ends_at)
     return db_product
 
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_product(
     product_id: int,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: TokenPrincipal = Depends(get_current_principal)
 ):
     """Delete a product"""
     db_product = db.query(Product).filter(Product.id == product_id).first()
@@ -107,5 +320,9 @@ async def delete_product(
         )
     
     db.delete(db_product)
+    facets.product_removed(db, db_product.category, db_product.price)
+    version = publish_product_event(db, PRODUCT_DELETED, db_product)
     db.commit()
+    note_write(response)
+    product_cache.invalidate(product_id, version)
     return None
@@ -0,0 +1,165 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import Optional
+from database import get_db, get_read_db, note_write
+from models.product import Product
+from models.review import Review
+from schemas.review import ReviewCreate, ReviewUpdate, ReviewResponse, ReviewPage
+from utils.auth import get_current_principal
+from utils.tokens import TokenPrincipal
+from utils import reviews
+from utils.catalog_events import publish_product_event, PRODUCT_UPDATED
+from utils.product_cache import product_cache
+
+router = APIRouter(prefix="/api/products", tags=["reviews"])
+
+
+@router.get("/{product_id}/reviews", response_model=ReviewPage)
+async def get_product_reviews(
+    product_id: int,
+    before_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_read_db)
+):
+    """Get a product's reviews, newest first, one page at a time"""
+    query = db.query(Review).filter(Review.product_id == product_id)
+    if before_id is not None:
+        query = query.filter(Review.id < before_id)
+    items = query.order_by(Review.id.desc()).limit(limit + 1).all()
+    
+    has_more = len(items) > limit
+    items = items[:limit]
+    return ReviewPage(
+        items=[ReviewResponse.model_validate(r) for r in items],
+        next_cursor=items[-1].id if has_more else None
+    )
+
+
+@router.post("/{product_id}/reviews", response_model=ReviewResponse, status_code=status.HTTP_201_CREATED)
+async def create_review(
+    product_id: int,
+    review: ReviewCreate,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: TokenPrincipal = Depends(get_current_principal)
+):
+    """Review a product"""
+    db_product = reviews.lock_product(db, product_id)
+    
+    if not db_product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+    
+    if db_product.created_by == current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You cannot review your own product"
+        )
+    
+    db_review = Review(
+        product_id=product_id,
+        user_id=current_user.id,
+        rating=review.rating,
+        comment=review.comment
+    )
+    db.add(db_review)
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="You have already reviewed this product"
+        )
+    
+    reviews.apply_review_added(db_product, review.rating)
+    version = publish_product_event(db, PRODUCT_UPDATED, db_product)
+    db.commit()
+    note_write(response)
+    product_cache.invalidate(product_id, version)
+    db.refresh(db_review)
+    return db_review
+
+
+@router.put("/{product_id}/reviews/{review_id}", response_model=ReviewResponse)
+async def update_review(
+    product_id: int,
+    review_id: int,
+    review: ReviewUpdate,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: TokenPrincipal = Depends(get_current_principal)
+):
+    """Update a review"""
+    db_product = reviews.lock_product(db, product_id)
+    db_review = db.query(Review).filter(
+        Review.id == review_id,
+        Review.product_id == product_id
+    ).first()
+    
+    if not db_product or not db_review:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Review not found"
+        )
+    
+    if db_review.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to update this review"
+        )
+    
+    old_rating = db_review.rating
+    update_data = review.model_dump(exclude_unset=True, exclude_none=True)
+    for key, value in update_data.items():
+        setattr(db_review, key, value)
+    
+    version = None
+    if db_review.rating != old_rating:
+        reviews.apply_review_changed(db_product, old_rating, db_review.rating)
+        version = publish_product_event(db, PRODUCT_UPDATED, db_product)
+    db.commit()
+    note_write(response)
+    if version is not None:
+        product_cache.invalidate(product_id, version)
+    db.refresh(db_review)
+    return db_review
+
+
+@router.delete("/{product_id}/reviews/{review_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_review(
+    product_id: int,
+    review_id: int,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: TokenPrincipal = Depends(get_current_principal)
+):
+    """Delete a review"""
+    db_product = reviews.lock_product(db, product_id)
+    db_review = db.query(Review).filter(
+        Review.id == review_id,
+        Review.product_id == product_id
+    ).first()
+    
+    if not db_product or not db_review:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Review not found"
+        )
+    
+    if db_review.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to delete this review"
+        )
+    
+    reviews.apply_review_removed(db_product, db_review.rating)
+    db.delete(db_review)
+    version = publish_product_event(db, PRODUCT_UPDATED, db_product)
+    db.commit()
+    note_write(response)
+    product_cache.invalidate(product_id, version)
+    return None
@@ -1,14 +1,24 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
+from fastapi.responses import FileResponse
 from pathlib import Path
 from typing import Optional
 import os
 import json
+import logging
 import aiohttp
 import asyncio
 from datetime import datetime
+from config import settings
+from utils.file_serving import build_file_index, iter_files, load_index, save_index, serve_file
+from utils.compression import payload_cache, payload_response, dump_json
+from utils.archives import ARCHIVE_FORMATS, download_name, get_archive, prebuild_archives
+from utils.markdown_render import is_markdown, render_markdown_files, rendered_path
+from utils.manifests import get_changes, list_generations, load_manifest, record_generation
 
 router = APIRouter(prefix="/templates", tags=["templates"])
 
+logger = logging.getLogger(__name__)
+
 # GitHub repository configuration
 GITHUB_OWNER = "manojkanur"
 GITHUB_REPO = "MicroSaaS-Template-Private"
@@ -23,6 +33,19 @@ CACHE_DIR.mkdir(exist_ok=True)
 # Metadata file for tracking sync status
 METADATA_FILE = CACHE_DIR / "_metadata.json"
 
+# Per-file hashes and precompressed variants, rebuilt on every sync
+INDEX_FILE = CACHE_DIR / "_index.json"
+VARIANTS_DIR = CACHE_DIR / "_variants"
+
+# Zip / tar.gz archives of cached directories, keyed by sync generation
+ARCHIVES_DIR = CACHE_DIR / "_archives"
+
+# Markdown rendered to HTML, keyed by content hash and kept across syncs
+RENDERED_DIR = CACHE_DIR / "_rendered"
+
+# Per-generation manifests, file contents and change sets, kept across syncs
+HISTORY_DIR = CACHE_DIR / "_history"
+
 # Allowed file extensions for viewing
 ALLOWED_EXTENSIONS = {
     '.py', '.js', '.jsx', '.ts', '.tsx', '.html', '.css', '.scss',
@@ -40,6 +63,19 @@ def get_metadata():
             return json.load(f)
     return {"last_sync": None, "status": "not_synced", "file_count": 0}
 
+_file_index_cache = {"mtime": None, "index": {}}
+
+def get_file_index():
+    """Get the sync-time file index, reloading only when the file changes"""
+    try:
+        mtime = INDEX_FILE.stat().st_mtime
+    except FileNotFoundError:
+        return {}
+    if _file_index_cache["mtime"] != mtime:
+        _file_index_cache["index"] = load_index(INDEX_FILE)
+        _file_index_cache["mtime"] = mtime
+    return _file_index_cache["index"]
+
 def save_metadata(data):
     """Save cache metadata"""
     with open(METADATA_FILE, 'w') as f:
@@ -103,13 +139,64 @@ async def sync_directory(session, path: str = "", depth: int = 0):
                             f.write(content)
                             
     except Exception as e:
-        print(f"Error syncing {path}: {e}")
+        logger.error("Error syncing %s: %s", path or "/", e)
+
+# One sync at a time per worker; concurrent syncs would wipe each other's files
+_sync_lock = asyncio.Lock()
 
 async def perform_sync():
     """Perform full sync from GitHub to local cache"""
-    # Clear existing cache (except metadata)
+    async with _sync_lock:
+        await _sync()
+
+async def ensure_synced():
+    """Sync unless the cache is synced, letting concurrent callers share one sync"""
+    if get_metadata().get("status") == "synced":
+        return
+    async with _sync_lock:
+        if get_metadata().get("status") != "synced":
+            await _sync()
+
+async def ensure_artifacts():
+    """
+    Build whatever a synced cache is missing from what a sync would have
+    built, e.g. for a cache synced by an older release. Runs at startup,
+    since a synced cache is otherwise left alone until the next sync.
+    """
+    async with _sync_lock:
+        metadata = get_metadata()
+        if metadata.get("status") != "synced":
+            return
+
+        if INDEX_FILE.exists():
+            index = load_index(INDEX_FILE)
+        else:
+            index = await asyncio.to_thread(build_file_index, CACHE_DIR, VARIANTS_DIR)
+            save_index(INDEX_FILE, index)
+            logger.info("Built missing file index (%d files)", len(index))
+
+        rendered, _ = await asyncio.to_thread(render_markdown_files, CACHE_DIR, index, RENDERED_DIR)
+        if rendered:
+            logger.info("Rendered %d missing Markdown files", rendered)
+
+        generation = metadata.get("generation", 0)
+        built = await asyncio.to_thread(prebuild_archives, CACHE_DIR, ARCHIVES_DIR, generation)
+        if built:
+            logger.info("Prebuilt %d missing archives for generation %d", built, generation)
+
+        # A baseline manifest, so changes can be requested from this generation on
+        if generation not in list_generations(HISTORY_DIR):
+            await asyncio.to_thread(
+                record_generation, CACHE_DIR, index, HISTORY_DIR, generation,
+                metadata.get("last_sync") or datetime.now().isoformat(),
+                settings.TEMPLATE_GENERATIONS_KEPT,
+            )
+            logger.info("Recorded baseline manifest for generation %d", generation)
+
+async def _sync():
+    # Clear existing cache (except metadata, renders and history, which outlive a sync)
     for item in CACHE_DIR.iterdir():
-        if item.name != "_metadata.json":
+        if item.name not in ("_metadata.json", RENDERED_DIR.name, HISTORY_DIR.name):
             if item.is_dir():
                 import shutil
                 shutil.rmtree(item)
@@ -119,18 +206,49 @@ async def perform_sync():
     async with aiohttp.ClientSession() as session:
         await sync_directory(session)
     
+    # Hash files and precompress them off the event loop
+    index = await asyncio.to_thread(build_file_index, CACHE_DIR, VARIANTS_DIR)
+    save_index(INDEX_FILE, index)
+    
+    # Render Markdown once here instead of in every viewer; unchanged files keep their render
+    rendered, reused = await asyncio.to_thread(render_markdown_files, CACHE_DIR, index, RENDERED_DIR)
+    logger.info("Rendered %d Markdown files (%d unchanged)", rendered, reused)
+    
     # Count files
-    file_count = sum(1 for _ in CACHE_DIR.rglob("*") if _.is_file() and _.name != "_metadata.json")
+    file_count = sum(1 for _ in iter_files(CACHE_DIR))
+    
+    # Each sync is a new generation; prebuild archives for the common downloads
+    generation = get_metadata().get("generation", 0) + 1
+    await asyncio.to_thread(prebuild_archives, CACHE_DIR, ARCHIVES_DIR, generation)
+    
+    # Record what this generation contains so clients can fetch only what changed
+    synced_at = datetime.now().isoformat()
+    await asyncio.to_thread(
+        record_generation, CACHE_DIR, index, HISTORY_DIR, generation, synced_at,
+        settings.TEMPLATE_GENERATIONS_KEPT,
+    )
     
     # Update metadata
     save_metadata({
-        "last_sync": datetime.now().isoformat(),
+        "last_sync": synced_at,
         "status": "synced",
         "file_count": file_count,
+        "generation": generation,
         "repo": f"{GITHUB_OWNER}/{GITHUB_REPO}",
         "branch": GITHUB_BRANCH
     })
 
+def resolve_cache_path(path: str) -> Path:
+    """Resolve a user-supplied path inside the cache, rejecting escapes and internal files"""
+    target_path = (CACHE_DIR / path).resolve()
+    try:
+        relative = target_path.relative_to(CACHE_DIR)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="File not found")
+    if relative.parts and relative.parts[0].startswith('_'):
+        raise HTTPException(status_code=404, detail="File not found")
+    return target_path
+
 def get_file_info(path: Path, base: Path) -> dict:
     """Get file/directory info"""
     relative_path = str(path.relative_to(base)).replace('\\', '/')
@@ -148,9 +266,8 @@ def get_file_info(path: Path, base: Path) -> dict:
     
     return info
 
-@router.get("/status")
-async def get_sync_status():
-    """Get the current sync status"""
+def sync_status() -> dict:
+    """Current sync status, as reported by /templates/status"""
     metadata = get_metadata()
     return {
         "status": metadata.get("status", "not_synced"),
@@ -160,28 +277,35 @@ async def get_sync_status():
         "branch": GITHUB_BRANCH
     }
 
+@router.get("/status")
+async def get_sync_status():
+    """Get the current sync status"""
+    return sync_status()
+
 @router.post("/sync")
 async def trigger_sync(background_tasks: BackgroundTasks):
     """Trigger a sync from GitHub (runs in background)"""
     save_metadata({
         "last_sync": get_metadata().get("last_sync"),
         "status": "syncing",
-        "file_count": get_metadata().get("file_count", 0)
+        "file_count": get_metadata().get("file_count", 0),
+        "generation": get_metadata().get("generation", 0)
     })
     
     # Run sync in background
-    background_tasks.add_task(asyncio.run, perform_sync())
+    background_tasks.add_task(perform_sync)
     
     return {"message": "Sync started", "status": "syncing"}
 
 @router.get("/files")
-async def get_template_files(path: Optional[str] = ""):
+async def get_template_files(request: Request, path: Optional[str] = ""):
     """Get list of files and directories at the given path"""
     metadata = get_metadata()
     
     # Auto-sync if not synced yet
     if metadata.get("status") != "synced":
-        await perform_sync()
+        await ensure_synced()
+        metadata = get_metadata()
     
     try:
         target_path = CACHE_DIR / path if path else CACHE_DIR
@@ -192,27 +316,37 @@ async def get_template_files(path: Optional[str] = ""):
         if not target_path.is_dir():
             raise HTTPException(status_code=400, detail="Path is not a directory")
         
-        items = []
-        for item in sorted(target_path.iterdir(), key=lambda x: (not x.is_dir(), x.name.lower())):
-            # Skip metadata file and hidden files
-            if item.name.startswith('_') or (item.name.startswith('.') and item.name not in ['.env.example', '.gitignore', '.claude']):
-                continue
+        def build_listing() -> bytes:
+            items = []
+            for item in sorted(target_path.iterdir(), key=lambda x: (not x.is_dir(), x.name.lower())):
+                # Skip metadata file and hidden files
+                if item.name.startswith('_') or (item.name.startswith('.') and item.name not in ['.env.example', '.gitignore', '.claude']):
+                    continue
+                
+                items.append(get_file_info(item, CACHE_DIR))
             
-            items.append(get_file_info(item, CACHE_DIR))
+            return dump_json({
+                "path": path,
+                "items": items,
+                "parent": str(Path(path).parent) if path else None,
+                "last_sync": metadata.get("last_sync")
+            })
         
-        return {
-            "path": path,
-            "items": items,
-            "parent": str(Path(path).parent) if path else None,
-            "last_sync": metadata.get("last_sync")
-        }
+        # Listings only change on sync, so render and compress once per sync
+        payload = payload_cache.get(
+            ("templates:files", path),
+            (metadata.get("generation"), metadata.get("last_sync")),
+            build_listing,
+        )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    return payload_response(payload, request.headers)
 
 @router.get("/content")
-async def get_file_content(path: str):
+async def get_file_content(request: Request, path: str):
     """Get content of a specific file"""
     try:
         target_path = CACHE_DIR / path
@@ -224,23 +358,169 @@ async def get_file_content(path: str):
             raise HTTPException(status_code=400, detail="Path is a directory")
         
         # Check file size (limit to 1MB)
-        if target_path.stat().st_size > 1024 * 1024:
+        stat = target_path.stat()
+        if stat.st_size > 1024 * 1024:
             raise HTTPException(status_code=400, detail="File too large to display")
         
-        try:
-            with open(target_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except UnicodeDecodeError:
-            raise HTTPException(status_code=400, detail="Binary file cannot be displayed")
+        def build_content() -> bytes:
+            try:
+                with open(target_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+            except UnicodeDecodeError:
+                raise HTTPException(status_code=400, detail="Binary file cannot be displayed")
+            
+            return dump_json({
+                "path": path,
+                "name": target_path.name,
+                "content": content,
+                "extension": target_path.suffix.lower(),
+                "size": len(content)
+            })
         
-        return {
-            "path": path,
-            "name": target_path.name,
-            "content": content,
-            "extension": target_path.suffix.lower(),
-            "size": len(content)
-        }
+        payload = payload_cache.get(
+            ("templates:content", path),
+            (stat.st_mtime_ns, stat.st_size),
+            build_content,
+        )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    return payload_response(payload, request.headers)
+
+@router.get("/rendered")
+async def get_rendered_content(request: Request, path: str):
+    """Get a Markdown file as sanitized HTML with its table of contents"""
+    target_path = resolve_cache_path(path)
+    
+    if not is_markdown(path):
+        raise HTTPException(status_code=400, detail="Only Markdown files are rendered")
+    
+    relative_path = str(target_path.relative_to(CACHE_DIR)).replace('\\', '/')
+    entry = get_file_index().get(relative_path)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    render_file = rendered_path(RENDERED_DIR, entry["sha256"])
+    if not render_file.exists():
+        raise HTTPException(status_code=404, detail="Rendered content not available")
+    
+    def build_rendered() -> bytes:
+        with open(render_file, 'r') as f:
+            rendered = json.load(f)
+        return dump_json({
+            "path": relative_path,
+            "name": target_path.name,
+            "sha256": entry["sha256"],
+            "html": rendered["html"],
+            "toc": rendered["toc"],
+        })
+    
+    payload = payload_cache.get(("templates:rendered", relative_path), entry["sha256"], build_rendered)
+    return payload_response(payload, request.headers)
+
+@router.get("/raw")
+async def get_raw_file(path: str, request: Request):
+    """
+    Stream a cached file as-is. Supports Range requests, conditional requests
+    via strong ETags, and serves gzip/brotli variants built at sync time.
+    """
+    target_path = resolve_cache_path(path)
+    
+    if not target_path.exists():
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    if target_path.is_dir():
+        raise HTTPException(status_code=400, detail="Path is a directory")
+    
+    relative_path = str(target_path.relative_to(CACHE_DIR)).replace('\\', '/')
+    entry = get_file_index().get(relative_path)
+    
+    return await serve_file(
+        target_path,
+        VARIANTS_DIR / relative_path,
+        entry,
+        request.headers,
+    )
+
+@router.get("/generations")
+async def get_generations():
+    """List the sync generations that changes can be requested between"""
+    generations = []
+    for generation in list_generations(HISTORY_DIR):
+        manifest = load_manifest(HISTORY_DIR, generation)
+        if manifest is None:
+            continue
+        generations.append({
+            "generation": generation,
+            "synced_at": manifest["synced_at"],
+            "file_count": len(manifest["files"]),
+        })
+    return {"current": get_metadata().get("generation", 0), "generations": generations}
+
+@router.get("/changes")
+async def get_template_changes(request: Request, from_generation: int, to_generation: Optional[int] = None):
+    """
+    Paths added, removed and modified between two sync generations (the
+    current one by default), with unified diffs for text files
+    """
+    metadata = get_metadata()
+    if metadata.get("status") != "synced":
+        raise HTTPException(status_code=503, detail="Templates are not synced yet")
+    
+    if to_generation is None:
+        to_generation = metadata.get("generation", 0)
+    if from_generation > to_generation:
+        raise HTTPException(status_code=400, detail="from_generation must not be after to_generation")
+    
+    available = list_generations(HISTORY_DIR)
+    for generation in (from_generation, to_generation):
+        if generation not in available:
+            raise HTTPException(status_code=404, detail=f"Generation {generation} is not available")
+    
+    changes_file = await get_changes(HISTORY_DIR, from_generation, to_generation)
+    # Change sets never change once computed, so the pair alone keys the cache
+    payload = payload_cache.get(
+        ("templates:changes", from_generation, to_generation),
+        0,
+        changes_file.read_bytes,
+    )
+    return payload_response(payload, request.headers)
+
+@router.get("/archive")
+async def get_template_archive(path: Optional[str] = "", format: str = "zip"):
+    """Download a directory of the cached tree as a zip or tar.gz archive"""
+    if format not in ARCHIVE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Use one of: {', '.join(ARCHIVE_FORMATS)}")
+    
+    metadata = get_metadata()
+    if metadata.get("status") != "synced":
+        raise HTTPException(status_code=503, detail="Templates are not synced yet")
+    
+    target_path = resolve_cache_path(path) if path else CACHE_DIR
+    
+    if not target_path.exists():
+        raise HTTPException(status_code=404, detail="Path not found")
+    
+    if not target_path.is_dir():
+        raise HTTPException(status_code=400, detail="Path is not a directory")
+    
+    relative_path = str(target_path.relative_to(CACHE_DIR)).replace('\\', '/') if path else ""
+    generation = metadata.get("generation", 0)
+    
+    archive_file = await get_archive(
+        CACHE_DIR,
+        ARCHIVES_DIR,
+        generation,
+        relative_path,
+        format,
+        settings.ARCHIVE_CACHE_MAX_MB * 1024 * 1024,
+    )
+    
+    return FileResponse(
+        archive_file,
+        media_type=ARCHIVE_FORMATS[format],
+        filename=download_name(relative_path, GITHUB_REPO, generation, format),
+        headers={"Cache-Control": "no-cache"},
+    )
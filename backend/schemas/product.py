@@ -1,6 +1,13 @@
-from pydantic import BaseModel
-from typing import Optional
-from datetime import datetime
+from pydantic import BaseModel, field_serializer, field_validator
+from typing import List, Optional
+from datetime import datetime, timezone
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Timestamps are stored as naive UTC, like datetime.utcnow()
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
 
 
 class ProductBase(BaseModel):
@@ -13,6 +20,9 @@ class ProductBase(BaseModel):
     image: Optional[str] = None
     badge: Optional[str] = None
     deal_ends: Optional[str] = None
+    deal_ends_at: Optional[datetime] = None
+
+    _normalize_deal_ends_at = field_validator("deal_ends_at")(_naive_utc)
 
 
 class ProductCreate(ProductBase):
@@ -29,6 +39,9 @@ class ProductUpdate(BaseModel):
     image: Optional[str] = None
     badge: Optional[str] = None
     deal_ends: Optional[str] = None
+    deal_ends_at: Optional[datetime] = None
+
+    _normalize_deal_ends_at = field_validator("deal_ends_at")(_naive_utc)
 
 
 class ProductResponse(ProductBase):
@@ -39,5 +52,33 @@ class ProductResponse(ProductBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
 
+    @field_serializer("deal_ends_at")
+    def _serialize_deal_ends_at(self, value: Optional[datetime]) -> Optional[datetime]:
+        # Stored naive (UTC); clients get an explicit offset so they don't read it as local time
+        if value is not None and value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
+
     class Config:
         from_attributes = True
+
+
+class PriceBucket(BaseModel):
+    min_price: float
+    max_price: Optional[float] = None  # None for the open-ended top bucket
+    count: int
+
+
+class CategoryFacetResponse(BaseModel):
+    category: str
+    count: int
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    histogram: List[PriceBucket]
+
+
+class FacetsResponse(BaseModel):
+    total: int
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    categories: List[CategoryFacetResponse]
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# Settings are read at import time, so point the app at a throwaway SQLite
+# database before anything imports `config`
+_db_dir = tempfile.mkdtemp(prefix="microsaas-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_dir}/test.db"
+os.environ["DATABASE_REPLICA_URLS"] = "[]"
@@ -0,0 +1,66 @@
+import asyncio
+
+from middleware.admission import AdmissionController, AdmissionMiddleware
+
+
+def _scope(path="/templates/raw"):
+    return {"type": "http", "method": "GET", "path": path, "headers": []}
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+def test_slot_is_released_when_the_response_starts():
+    controller = AdmissionController({"templates": 1}, max_queue=0, timeout=1)
+    limiter = controller.limiters["templates"]
+    active_while_streaming = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        active_while_streaming.append(limiter.active)
+        await send({"type": "http.response.body", "body": b"chunk", "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    asyncio.run(AdmissionMiddleware(app, controller)(_scope(), _receive, send))
+    assert active_while_streaming == [0]
+    # Released exactly once
+    assert limiter.active == 0
+
+
+def test_slot_is_released_when_the_handler_fails():
+    controller = AdmissionController({"templates": 1}, max_queue=0, timeout=1)
+
+    async def app(scope, receive, send):
+        raise RuntimeError("boom")
+
+    async def send(message):
+        pass
+
+    try:
+        asyncio.run(AdmissionMiddleware(app, controller)(_scope(), _receive, send))
+    except RuntimeError:
+        pass
+    assert controller.limiters["templates"].active == 0
+
+
+def test_saturated_class_is_rejected():
+    controller = AdmissionController({"templates": 1}, max_queue=0, timeout=1)
+    sent = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        await controller.limiters["templates"].acquire()
+        await AdmissionMiddleware(app, controller)(_scope(), _receive, send)
+
+    asyncio.run(run())
+    assert sent[0]["status"] == 503
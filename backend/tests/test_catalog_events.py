@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models.catalog_event import CatalogEvent
+from routes import products
+from utils import catalog_events
+from utils.catalog_events import RETRY_FRAME, CatalogEventBroadcaster, format_event
+import models.catalog, models.facet, models.otp  # noqa: F401,E401
+import models.product, models.review, models.revoked_token, models.user  # noqa: F401,E401
+
+
+def _events(*ids):
+    return [(event_id, "product.updated", f'{{"id":{event_id}}}') for event_id in ids]
+
+
+def _frames(*ids):
+    return b"".join(format_event(*event) for event in _events(*ids))
+
+
+def test_resume_replays_from_the_buffer():
+    async def run():
+        broadcaster = CatalogEventBroadcaster(8)
+        broadcaster.append(_events(1, 2, 3, 4))
+        stream = broadcaster.stream(2)
+        assert await stream.__anext__() == RETRY_FRAME
+        assert await stream.__anext__() == _frames(3, 4)
+        assert broadcaster.subscribers == 1
+
+        # Then waits for the next publish
+        next_frame = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        assert not next_frame.done()
+        broadcaster.append(_events(5))
+        assert await asyncio.wait_for(next_frame, 1) == _frames(5)
+
+        await stream.aclose()
+        assert broadcaster.subscribers == 0
+
+    asyncio.run(run())
+
+
+def test_new_connections_start_at_the_latest_event():
+    async def run():
+        broadcaster = CatalogEventBroadcaster(8)
+        broadcaster.append(_events(1, 2))
+        stream = broadcaster.stream(None)
+        assert await stream.__anext__() == RETRY_FRAME
+        next_frame = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        broadcaster.append(_events(3))
+        assert await asyncio.wait_for(next_frame, 1) == _frames(3)
+        await stream.aclose()
+
+    asyncio.run(run())
+
+
+def test_resume_from_outside_the_buffer_resets():
+    async def run():
+        broadcaster = CatalogEventBroadcaster(3)
+        broadcaster.append(_events(1, 2, 3, 4, 5))
+        # 3, 4 and 5 are buffered, so resuming after 2 is still complete
+        assert [event_id for event_id, _ in broadcaster.since(2)] == [3, 4, 5]
+        assert broadcaster.since(1) is None
+
+        stream = broadcaster.stream(1)
+        assert await stream.__anext__() == RETRY_FRAME
+        assert await stream.__anext__() == format_event(5, "reset", "{}")
+        # After the reset the connection follows live events as usual
+        next_frame = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        broadcaster.append(_events(6))
+        assert await asyncio.wait_for(next_frame, 1) == _frames(6)
+        await stream.aclose()
+
+    asyncio.run(run())
+
+
+def test_too_many_subscribers_is_a_503(monkeypatch):
+    broadcaster = CatalogEventBroadcaster(8)
+    broadcaster.subscribers = 2
+    monkeypatch.setattr(products, "catalog_broadcaster", broadcaster)
+    monkeypatch.setattr(products.settings, "CATALOG_EVENTS_MAX_SUBSCRIBERS", 2)
+    app = FastAPI()
+    app.include_router(products.router)
+
+    response = TestClient(app).get("/api/products/events")
+    assert response.status_code == 503
+
+
+def test_purge_drops_only_expired_events(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'events.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(catalog_events, "SessionLocal", factory)
+    monkeypatch.setattr(catalog_events.settings, "CATALOG_EVENTS_RETENTION_MINUTES", 10)
+
+    db = factory()
+    now = datetime.utcnow()
+    db.add_all([
+        CatalogEvent(id=1, event_type="product.updated", data="{}", created_at=now - timedelta(minutes=30)),
+        CatalogEvent(id=2, event_type="product.updated", data="{}", created_at=now - timedelta(minutes=11)),
+        CatalogEvent(id=3, event_type="product.updated", data="{}", created_at=now - timedelta(minutes=1)),
+    ])
+    db.commit()
+
+    assert catalog_events.purge_catalog_events() == 2
+    assert [event.id for event in db.query(CatalogEvent)] == [3]
+    db.close()
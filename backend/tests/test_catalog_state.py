@@ -0,0 +1,37 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from migrations import run_migrations
+from models.catalog import CatalogState, bump_catalog_version, get_catalog_version
+import models.catalog_event, models.facet, models.otp  # noqa: F401,E401
+import models.product, models.review, models.revoked_token, models.user  # noqa: F401,E401
+
+
+def _session(tmp_path, migrate: bool):
+    engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}")
+    Base.metadata.create_all(bind=engine)
+    if migrate:
+        run_migrations(engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+
+def test_migrations_seed_the_version_row(tmp_path):
+    db = _session(tmp_path, migrate=True)
+    assert db.get(CatalogState, 1).version == 0
+
+    bump_catalog_version(db)
+    bump_catalog_version(db)
+    db.commit()
+    assert get_catalog_version(db) == 2
+
+
+def test_unseeded_database_gets_the_row_on_first_write(tmp_path):
+    db = _session(tmp_path, migrate=False)
+    assert get_catalog_version(db) == 0
+
+    bump_catalog_version(db)
+    db.commit()
+    bump_catalog_version(db)
+    db.commit()
+    assert get_catalog_version(db) == 2
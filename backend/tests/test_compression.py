@@ -0,0 +1,45 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+
+from middleware.compression import CompressionMiddleware
+from utils.file_serving import serve_file
+
+TEXT = "All work and no play makes Jack a dull boy.\n" * 200
+
+
+@pytest.fixture
+def client(tmp_path):
+    text_file = tmp_path / "notes.md"
+    text_file.write_text(TEXT)
+
+    async def listing(request):
+        return Response(TEXT, media_type="text/plain")
+
+    async def raw_file(request):
+        # A cached template file with no precompressed variant
+        return await serve_file(text_file, None, None, request.headers)
+
+    app = Starlette(routes=[Route("/listing", listing), Route("/raw", raw_file)])
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return TestClient(app)
+
+
+def test_large_text_is_compressed(client):
+    response = client.get("/listing", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text == TEXT
+
+
+def test_range_capable_files_are_not_compressed(client):
+    response = client.get("/raw", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.text == TEXT
+
+    partial = client.get("/raw", headers={"Accept-Encoding": "gzip", "Range": "bytes=0-9"})
+    assert partial.status_code == 206
+    assert "content-encoding" not in partial.headers
+    assert partial.content == TEXT.encode()[:10]
@@ -0,0 +1,102 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import database
+from database import Base
+from models.catalog import bump_catalog_version
+from models.product import Product
+from models.user import User
+from routes import dashboard, products, templates
+from utils.auth import get_current_principal
+from utils.compression import PayloadCache
+from utils.tokens import TokenPrincipal
+import models.catalog_event, models.facet, models.otp  # noqa: F401,E401
+import models.review, models.revoked_token  # noqa: F401,E401
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'dashboard.db'}")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(database, "SessionLocal", session_factory)
+    monkeypatch.setattr(products, "payload_cache", PayloadCache(8))
+    monkeypatch.setattr(templates, "METADATA_FILE", tmp_path / "_metadata.json")
+
+    session = session_factory()
+    session.add(User(id=1, email="seller@example.com"))
+    session.add(Product(name="Lamp", category="Home", price=10.0, created_by=1))
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def client(db):
+    app = FastAPI()
+    app.include_router(dashboard.router)
+    app.dependency_overrides[get_current_principal] = lambda: TokenPrincipal(
+        id=1, email="seller@example.com", auth_provider="email", jti=None, expires_at=None
+    )
+    return TestClient(app)
+
+
+def test_sections_share_one_session(client, monkeypatch):
+    open_sessions, most = [], []
+    open_read_session, close_read_session = dashboard.open_read_session, dashboard.close_read_session
+
+    def counting_open(primary=False):
+        open_sessions.append(None)
+        most.append(len(open_sessions))
+        return open_read_session(primary)
+
+    def counting_close(db):
+        open_sessions.pop()
+        close_read_session(db)
+
+    monkeypatch.setattr(dashboard, "open_read_session", counting_open)
+    monkeypatch.setattr(dashboard, "close_read_session", counting_close)
+
+    body = client.get("/api/dashboard").json()
+    assert body["user"]["email"] == "seller@example.com"
+    assert [p["name"] for p in body["my_products"]] == ["Lamp"]
+    assert [p["name"] for p in body["products"]] == ["Lamp"]
+    assert body["templates_status"]["status"] == "not_synced"
+    assert body["unchanged"] == []
+    assert most == [1]
+
+
+def test_known_sections_come_back_unchanged(client, db):
+    first = client.get("/api/dashboard")
+    etags = first.json()["etags"]
+    assert set(etags) == {"user", "my_products", "products", "templates_status"}
+
+    # Only the product sections change when a product is added
+    db.add(Product(name="Rug", category="Home", price=20.0, created_by=1))
+    bump_catalog_version(db)
+    db.commit()
+    second = client.get("/api/dashboard", headers={"If-None-Match": ", ".join(etags.values())})
+    body = second.json()
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert sorted(body["unchanged"]) == ["templates_status", "user"]
+    assert body["user"] is None and body["templates_status"] is None
+    assert sorted(p["name"] for p in body["my_products"]) == ["Lamp", "Rug"]
+    assert body["etags"]["user"] == etags["user"]
+    assert body["etags"]["products"] != etags["products"]
+
+
+def test_nothing_changed_is_a_304(client):
+    first = client.get("/api/dashboard")
+    etag = first.headers["ETag"]
+
+    assert client.get("/api/dashboard", headers={"If-None-Match": etag}).status_code == 304
+    # Holding every section's ETag counts too
+    section_etags = ", ".join(f"W/{tag}" for tag in first.json()["etags"].values())
+    not_modified = client.get("/api/dashboard", headers={"If-None-Match": section_etags})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag
+    assert not_modified.content == b""
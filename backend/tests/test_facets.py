@@ -0,0 +1,50 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models.facet import CategoryFacet
+from models.product import Product  # noqa: F401
+from utils import facets
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'facets.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+
+
+def test_first_product_creates_the_facet(db):
+    facets.product_added(db, "Tools", 30)
+    facets.product_added(db, "Tools", 5)
+    db.commit()
+
+    facet = db.get(CategoryFacet, "Tools")
+    assert (facet.product_count, facet.min_price, facet.max_price) == (2, 5, 30)
+    histogram = json.loads(facet.histogram)
+    assert histogram[facets.bucket_index(30)] == 1 and histogram[facets.bucket_index(5)] == 1
+
+
+def test_removing_the_last_product_then_adding_one_recreates_the_facet(db):
+    facets.product_added(db, "Tools", 30)
+    db.commit()
+
+    facets.product_changed(db, "Tools", 30, "Tools", 60)
+    db.commit()
+
+    facet = db.get(CategoryFacet, "Tools")
+    assert (facet.product_count, facet.min_price, facet.max_price) == (1, 60, 60)
+
+
+def test_mysql_upsert_locks_an_existing_row_exclusively():
+    mysql_session = SimpleNamespace(get_bind=lambda: SimpleNamespace(dialect=mysql.dialect()))
+    sql = str(facets._facet_upsert(mysql_session, "Tools").compile(dialect=mysql.dialect()))
+    # A no-op ON DUPLICATE KEY UPDATE takes an exclusive lock; INSERT IGNORE a shared one
+    assert "ON DUPLICATE KEY UPDATE" in sql and "IGNORE" not in sql
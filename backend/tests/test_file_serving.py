@@ -0,0 +1,119 @@
+import hashlib
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.routing import Route
+
+from utils import file_serving
+from utils.file_serving import parse_range, serve_file
+
+BODY = bytes(range(256)) * 8
+ETAG = f'"{hashlib.sha256(BODY).hexdigest()}"'
+
+
+def test_parse_range():
+    size = len(BODY)
+    assert parse_range("bytes=0-99", size) == (0, 99)
+    assert parse_range("bytes=100-", size) == (100, size - 1)
+    assert parse_range("bytes=-100", size) == (size - 100, size - 1)
+    # Ends past the file are clamped, as are suffixes longer than it
+    assert parse_range("bytes=2000-9999", size) == (2000, size - 1)
+    assert parse_range("bytes=-9999", size) == (0, size - 1)
+
+
+def test_parse_range_ignores_what_it_does_not_serve():
+    size = len(BODY)
+    assert parse_range("items=0-9", size) is None
+    assert parse_range("bytes=0-9,20-29", size) is None
+    assert parse_range("bytes=ten-", size) is None
+    assert parse_range("bytes=5", size) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=2048-", "bytes=9000-9999", "bytes=10-5", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        parse_range(header, len(BODY))
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(BODY)
+
+    async def raw_file(request):
+        # No index entry, so the file is hashed on request
+        return await serve_file(path, None, None, request.headers)
+
+    return TestClient(Starlette(routes=[Route("/raw", raw_file)]))
+
+
+def test_single_ranges(client):
+    response = client.get("/raw", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == BODY[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(BODY)}"
+
+    assert client.get("/raw", headers={"Range": "bytes=-16"}).content == BODY[-16:]
+    assert client.get("/raw", headers={"Range": "bytes=2000-"}).content == BODY[2000:]
+
+
+def test_unsatisfiable_range_is_a_416(client):
+    response = client.get("/raw", headers={"Range": f"bytes={len(BODY)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(BODY)}"
+
+
+def test_if_range(client):
+    current = client.get("/raw", headers={"Range": "bytes=0-3", "If-Range": ETAG})
+    assert current.status_code == 206
+    assert current.content == BODY[:4]
+
+    # A stale validator means the client's copy changed: send the whole file
+    stale = client.get("/raw", headers={"Range": "bytes=0-3", "If-Range": '"0123"'})
+    assert stale.status_code == 200
+    assert stale.content == BODY
+
+
+def test_strong_etag_revalidates(client):
+    response = client.get("/raw")
+    assert response.headers["etag"] == ETAG
+    assert client.get("/raw", headers={"If-None-Match": ETAG}).status_code == 304
+    # Any encoded representation of the same content revalidates too
+    assert client.get("/raw", headers={"If-None-Match": ETAG[:-1] + '-gzip"'}).status_code == 304
+    assert client.get("/raw", headers={"If-None-Match": '"0123"'}).status_code == 200
+
+
+def test_unindexed_files_are_hashed_off_the_event_loop(tmp_path, monkeypatch):
+    path = tmp_path / "data.bin"
+    path.write_bytes(BODY)
+    hashed_on, served_on = [], []
+    hash_file = file_serving.hash_file
+
+    def recording_hash(p):
+        hashed_on.append(threading.get_ident())
+        return hash_file(p)
+
+    monkeypatch.setattr(file_serving, "hash_file", recording_hash)
+
+    async def raw_file(request):
+        served_on.append(threading.get_ident())
+        # An entry from an older sync (different size) is ignored
+        return await serve_file(path, None, {"sha256": "stale", "size": 1}, request.headers)
+
+    response = TestClient(Starlette(routes=[Route("/raw", raw_file)])).get("/raw")
+    assert response.headers["etag"] == ETAG
+    assert len(hashed_on) == 1 and hashed_on != served_on
+
+
+def test_indexed_files_skip_hashing(tmp_path, monkeypatch):
+    path = tmp_path / "data.bin"
+    path.write_bytes(BODY)
+    monkeypatch.setattr(file_serving, "hash_file", lambda p: pytest.fail("hashed an indexed file"))
+
+    async def raw_file(request):
+        return await serve_file(path, None, {"sha256": "abc", "size": len(BODY)}, request.headers)
+
+    response = TestClient(Starlette(routes=[Route("/raw", raw_file)])).get("/raw")
+    assert response.headers["etag"] == '"abc"'
@@ -0,0 +1,160 @@
+import asyncio
+import datetime
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+from aiohttp import web
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt as google_jwt
+
+from utils.google_auth import UNKNOWN_KEY_REFETCH_SECONDS, GoogleCertCache, GoogleTokenVerifier
+
+AUDIENCE = "client-id.apps.googleusercontent.com"
+
+
+class SigningKey:
+    """An RSA key and the self-signed certificate Google would publish for it"""
+
+    def __init__(self, key_id: str):
+        self.key_id = key_id
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, key_id)])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        certificate = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256())
+        )
+        self.cert_pem = certificate.public_bytes(serialization.Encoding.PEM).decode()
+        private_pem = key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+        self.signer = crypt.RSASigner.from_string(private_pem, key_id)
+
+    def token(self, **claims) -> str:
+        now = int(time.time())
+        payload = {
+            "iss": "https://accounts.google.com",
+            "aud": AUDIENCE,
+            "sub": "1234",
+            "email": "user@example.com",
+            "iat": now,
+            "exp": now + 3600,
+            **claims,
+        }
+        return google_jwt.encode(self.signer, payload).decode()
+
+
+@pytest.fixture(scope="module")
+def keys():
+    return {"a": SigningKey("a"), "b": SigningKey("b")}
+
+
+class CertsEndpoint:
+    """Local stand-in for Google's certs endpoint"""
+
+    def __init__(self, published, max_age=3600):
+        self.published = list(published)
+        self.max_age = max_age
+        self.fetches = 0
+
+    async def handle(self, request):
+        self.fetches += 1
+        return web.json_response(
+            {key.key_id: key.cert_pem for key in self.published},
+            headers={"Cache-Control": f"public, max-age={self.max_age}"},
+        )
+
+    @asynccontextmanager
+    async def serve(self):
+        app = web.Application()
+        app.router.add_get("/certs", self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        cache = GoogleCertCache(f"http://127.0.0.1:{port}/certs")
+        try:
+            yield cache, GoogleTokenVerifier(cache)
+        finally:
+            await cache.close()
+            await runner.cleanup()
+
+
+def test_certs_are_cached_for_their_max_age(keys):
+    endpoint = CertsEndpoint([keys["a"]])
+
+    async def run():
+        async with endpoint.serve() as (cache, verifier):
+            first = await cache.get_certs()
+            second = await cache.get_certs()
+            assert await verifier.verify(keys["a"].token(), AUDIENCE)
+            return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second and set(first) == {"a"}
+    assert endpoint.fetches == 1
+
+
+def test_unknown_key_id_refetches_the_certs(keys):
+    endpoint = CertsEndpoint([keys["a"]])
+
+    async def run():
+        async with endpoint.serve() as (cache, verifier):
+            await cache.get_certs()
+            cache._fetched_at -= UNKNOWN_KEY_REFETCH_SECONDS
+            # Google rotates to a new key before the cached certs expire
+            endpoint.published = [keys["a"], keys["b"]]
+            return await verifier.verify(keys["b"].token(), AUDIENCE)
+
+    assert asyncio.run(run())["email"] == "user@example.com"
+    assert endpoint.fetches == 2
+
+
+def test_unknown_key_ids_refetch_at_most_once_per_interval(keys):
+    endpoint = CertsEndpoint([keys["a"]])
+
+    async def run():
+        async with endpoint.serve() as (cache, verifier):
+            await cache.get_certs()
+            cache._fetched_at -= UNKNOWN_KEY_REFETCH_SECONDS
+            for _ in range(3):
+                with pytest.raises(ValueError):
+                    await verifier.verify(keys["b"].token(), AUDIENCE)
+
+    asyncio.run(run())
+    assert endpoint.fetches == 2
+
+
+@pytest.mark.parametrize("claims", [{"aud": "someone-else"}, {"iss": "https://evil.example.com"}])
+def test_wrong_audience_or_issuer_is_rejected(keys, claims):
+    endpoint = CertsEndpoint([keys["a"]])
+
+    async def run():
+        async with endpoint.serve() as (cache, verifier):
+            await verifier.verify(keys["a"].token(**claims), AUDIENCE)
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+
+
+def test_stale_certs_are_served_when_the_endpoint_fails(keys):
+    endpoint = CertsEndpoint([keys["a"]], max_age=0)
+
+    async def run():
+        async with endpoint.serve() as (cache, verifier):
+            await cache.get_certs()
+            endpoint.published = None  # handler now fails with a 500
+            return await verifier.verify(keys["a"].token(), AUDIENCE)
+
+    assert asyncio.run(run())["sub"] == "1234"
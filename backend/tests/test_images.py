@@ -0,0 +1,193 @@
+import asyncio
+import base64
+import io
+import os
+from contextlib import asynccontextmanager
+
+import pytest
+from aiohttp import web
+from PIL import Image
+
+from config import settings
+from utils import images
+from utils.images import THUMBNAIL_SIZES, ImageProxy, ImageUnavailable, evict_images
+
+
+def _png(width=1200, height=600) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 40, 40)).save(output, "PNG")
+    return output.getvalue()
+
+
+@asynccontextmanager
+async def _origin(handler):
+    """Local stand-in for an image origin; yields its base URL"""
+    app = web.Application()
+    app.router.add_get("/{name}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        await runner.cleanup()
+
+
+@pytest.fixture
+def allow_private_hosts(monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_PROXY_ALLOW_PRIVATE_HOSTS", True)
+
+
+def test_concurrent_requests_share_one_fetch(tmp_path, allow_private_hosts):
+    hits = []
+    image = _png()
+
+    async def handler(request):
+        hits.append(request.path)
+        await asyncio.sleep(0.1)
+        return web.Response(body=image, content_type="image/png")
+
+    async def run():
+        proxy = ImageProxy(tmp_path)
+        async with _origin(handler) as base:
+            try:
+                return await asyncio.gather(*(proxy.get_thumbnail(f"{base}/a.png", "card") for _ in range(5)))
+            finally:
+                await proxy.close()
+
+    results = asyncio.run(run())
+    assert hits == ["/a.png"]
+    assert len(set(results)) == 1
+    path, _ = results[0]
+    with Image.open(path) as thumbnail:
+        assert thumbnail.format == "WEBP" and thumbnail.width == THUMBNAIL_SIZES["card"]
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_oversized_source_is_refused(tmp_path, allow_private_hosts, monkeypatch, chunked):
+    monkeypatch.setattr(settings, "IMAGE_PROXY_MAX_SOURCE_MB", 0.01)
+    body = b"\0" * 64 * 1024
+
+    async def handler(request):
+        if not chunked:
+            return web.Response(body=body, content_type="image/png")
+        response = web.StreamResponse(headers={"Content-Type": "image/png"})
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        for start in range(0, len(body), 4096):
+            await response.write(body[start:start + 4096])
+        await response.write_eof()
+        return response
+
+    async def run():
+        proxy = ImageProxy(tmp_path)
+        async with _origin(handler) as base:
+            try:
+                await proxy.get_thumbnail(f"{base}/big.png", "card")
+            finally:
+                await proxy.close()
+
+    with pytest.raises(ImageUnavailable, match="too large"):
+        asyncio.run(run())
+
+
+@pytest.mark.parametrize("host", ["127.0.0.1", "localhost"])
+def test_private_hosts_are_refused(tmp_path, monkeypatch, host):
+    monkeypatch.setattr(settings, "IMAGE_PROXY_ALLOW_PRIVATE_HOSTS", False)
+    hits = []
+
+    async def handler(request):
+        hits.append(request.path)
+        return web.Response(body=_png(), content_type="image/png")
+
+    async def run():
+        proxy = ImageProxy(tmp_path)
+        async with _origin(handler) as base:
+            try:
+                # An IP literal is refused up front; a name when it resolves, at connect time
+                await proxy.get_thumbnail(base.replace("127.0.0.1", host) + "/a.png", "card")
+            finally:
+                await proxy.close()
+
+    with pytest.raises(ImageUnavailable, match="not a public host"):
+        asyncio.run(run())
+    assert hits == []
+
+
+def test_redirect_to_a_private_host_is_refused(tmp_path, monkeypatch):
+    async def run():
+        # Every hop is checked, whatever the first one resolved to
+        monkeypatch.setattr(settings, "IMAGE_PROXY_ALLOW_PRIVATE_HOSTS", True)
+        proxy = ImageProxy(tmp_path)
+
+        async def handler(request):
+            monkeypatch.setattr(settings, "IMAGE_PROXY_ALLOW_PRIVATE_HOSTS", False)
+            raise web.HTTPFound("http://10.0.0.1/a.png")
+
+        async with _origin(handler) as base:
+            try:
+                await proxy.get_thumbnail(f"{base}/start.png", "card")
+            finally:
+                await proxy.close()
+
+    with pytest.raises(ImageUnavailable, match="not a public host"):
+        asyncio.run(run())
+
+
+def test_eviction_removes_least_recently_used_first(tmp_path):
+    thumbnails = tmp_path / images.THUMBNAILS_DIR_NAME
+    for age, content_hash in enumerate(["newest", "middle", "oldest"]):
+        path = thumbnails / content_hash / "card.webp"
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (1000 - age, 1000 - age))
+
+    evict_images(tmp_path, max_bytes=200)
+    assert sorted(p.name for p in thumbnails.iterdir()) == ["middle", "newest"]
+
+    # The image being served is kept even when it is the oldest
+    evict_images(tmp_path, max_bytes=0, keep="middle")
+    assert [p.name for p in thumbnails.iterdir()] == ["middle"]
+
+
+def test_eviction_leaves_writes_in_progress_alone(tmp_path):
+    in_progress = tmp_path / images.THUMBNAILS_DIR_NAME / "other" / "tmpa1b2c3.tmp"
+    in_progress.parent.mkdir(parents=True)
+    in_progress.write_bytes(b"x" * 100)
+    os.utime(in_progress, (1, 1))
+
+    assert evict_images(tmp_path, max_bytes=0) == 0
+    assert in_progress.exists()
+
+
+def test_misses_walk_the_cache_only_when_eviction_is_due(tmp_path, monkeypatch):
+    walks = []
+
+    def counting_evict(*args):
+        walks.append(args)
+        return evict_images(*args)
+
+    monkeypatch.setattr(images, "evict_images", counting_evict)
+    monkeypatch.setattr(settings, "IMAGE_CACHE_MAX_MB", 1)
+    sources = [
+        "data:image/png;base64," + base64.b64encode(_png(300 + i, 200)).decode() for i in range(4)
+    ]
+    extra = sources.pop()
+
+    async def run():
+        proxy = ImageProxy(tmp_path)
+        for source in sources:
+            await proxy.get_thumbnail(source, "small")
+        # The first miss measures the cache; the others add to the running total
+        assert len(walks) == 1
+
+        # Over the limit, the next miss evicts everything but its own image
+        monkeypatch.setattr(settings, "IMAGE_CACHE_MAX_MB", 0)
+        _, content_hash = await proxy.get_thumbnail(extra, "small")
+        assert len(walks) == 2
+        return content_hash
+
+    content_hash = asyncio.run(run())
+    assert [p.name for p in (tmp_path / images.THUMBNAILS_DIR_NAME).iterdir()] == [content_hash]
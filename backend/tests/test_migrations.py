@@ -0,0 +1,32 @@
+import threading
+
+from sqlalchemy import create_engine
+
+from database import Base
+from migrations import MIGRATIONS, run_migrations
+# Register every table with Base.metadata
+import models.catalog, models.catalog_event, models.facet, models.otp  # noqa: F401,E401
+import models.product, models.review, models.revoked_token, models.user  # noqa: F401,E401
+
+
+def test_concurrent_workers_apply_each_migration_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    Base.metadata.create_all(bind=engine)
+
+    results, errors = [], []
+
+    def worker():
+        try:
+            results.append(run_migrations(engine))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(version for applied in results for version in applied) == sorted(MIGRATIONS)
+    assert run_migrations(engine) == []
@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.encoders import jsonable_encoder
+
+from schemas.product import ProductCreate, ProductResponse
+
+
+def _response(**fields) -> ProductResponse:
+    return ProductResponse(
+        id=1, name="Tool", category="Tools", price=10, rating=5, review_count=0,
+        created_by=1, created_at=datetime(2026, 1, 1), **fields,
+    )
+
+
+def test_deal_end_is_stored_as_naive_utc():
+    ends_at = datetime(2026, 3, 1, 17, 30, tzinfo=timezone(timedelta(hours=5, minutes=30)))
+    assert ProductCreate(name="Tool", category="Tools", price=10, deal_ends_at=ends_at).deal_ends_at == datetime(2026, 3, 1, 12, 0)
+
+
+def test_deal_end_is_serialized_as_utc():
+    product = _response(deal_ends_at=datetime(2026, 3, 1, 12, 0))
+    # The model keeps the naive value for comparisons against the database
+    assert product.deal_ends_at.tzinfo is None
+    assert jsonable_encoder(product)["deal_ends_at"] == "2026-03-01T12:00:00Z"
+    assert ProductResponse.model_validate_json(product.model_dump_json()).deal_ends_at == datetime(2026, 3, 1, 12, 0)
+
+
+def test_missing_deal_end_stays_null():
+    assert jsonable_encoder(_response())["deal_ends_at"] is None
@@ -0,0 +1,32 @@
+import pytest
+from sqlalchemy import create_engine, select
+
+from database import Base
+from migrations import run_migrations
+from models.product import Product
+from utils import query_plans
+from utils.query_plans import QUERY_SHAPES, explain
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    return engine
+
+
+@pytest.mark.parametrize("name", sorted(QUERY_SHAPES))
+def test_query_shape_uses_an_index(engine, name):
+    assert explain(engine, QUERY_SHAPES[name]()) == []
+
+
+def test_unindexed_filter_is_reported(engine):
+    problems = explain(engine, select(Product).where(Product.description == "x"))
+    assert problems and problems[0].startswith("full table scan")
+
+
+def test_main_exits_non_zero_on_a_regression(monkeypatch):
+    assert query_plans.main([]) == 0
+    monkeypatch.setattr(query_plans, "check_query_plans", lambda engine: {"products_by_id": ["full table scan"]})
+    assert query_plans.main([]) == 1
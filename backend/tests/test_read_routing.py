@@ -0,0 +1,66 @@
+import pytest
+from fastapi import Depends, FastAPI, Response
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session, sessionmaker
+
+import database
+from database import LAST_WRITE_HEADER, ReplicaPool, get_read_db, note_write
+
+
+def _engine_named(path, name):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE whoami (name TEXT)"))
+        connection.execute(text("INSERT INTO whoami VALUES (:name)"), {"name": name})
+    return engine
+
+
+app = FastAPI()
+
+
+@app.post("/write")
+def write(response: Response):
+    note_write(response)
+
+
+@app.get("/read")
+def read(db: Session = Depends(get_read_db)):
+    return db.execute(text("SELECT name FROM whoami")).scalar()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    primary = _engine_named(tmp_path / "primary.db", "primary")
+    _engine_named(tmp_path / "replica.db", "replica")
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=primary))
+    monkeypatch.setattr(database, "replicas", ReplicaPool([f"sqlite:///{tmp_path / 'replica.db'}"]))
+    return TestClient(app)
+
+
+def test_reads_go_to_the_replica(client):
+    assert client.get("/read").json() == "replica"
+
+
+def test_reads_after_a_write_go_to_the_primary(client):
+    last_write = client.post("/write").headers[LAST_WRITE_HEADER]
+    assert client.get("/read", headers={LAST_WRITE_HEADER: last_write}).json() == "primary"
+    # Other clients (no echoed write) still read from the replica
+    assert client.get("/read").json() == "replica"
+
+
+def test_stale_or_bogus_write_stamps_are_ignored(client, monkeypatch):
+    monkeypatch.setattr(database.settings, "READ_YOUR_WRITES_SECONDS", 5)
+    assert client.get("/read", headers={LAST_WRITE_HEADER: "1000"}).json() == "replica"
+    assert client.get("/read", headers={LAST_WRITE_HEADER: "soon"}).json() == "replica"
+
+
+def test_unreachable_replica_falls_back_to_the_primary(tmp_path, monkeypatch):
+    primary = _engine_named(tmp_path / "primary.db", "primary")
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=primary))
+    # SQLite can't create a database in a directory that doesn't exist
+    pool = ReplicaPool([f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"])
+    monkeypatch.setattr(database, "replicas", pool)
+
+    assert TestClient(app).get("/read").json() == "primary"
+    assert pool.healthy() == []
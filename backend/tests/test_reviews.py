@@ -0,0 +1,184 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import database
+from database import Base
+from models.product import Product
+from models.review import Review
+from models.user import User
+from routes import reviews as review_routes
+from utils import reviews
+from utils.auth import get_current_principal
+from utils.tokens import TokenPrincipal
+import models.catalog, models.catalog_event, models.facet, models.otp  # noqa: F401,E401
+import models.revoked_token  # noqa: F401
+
+SELLER = 1
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'reviews.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(database, "SessionLocal", factory)
+
+    db = factory()
+    db.add_all([User(id=i, email=f"user{i}@example.com") for i in range(1, 30)])
+    db.add(Product(id=1, name="Lamp", category="Home", price=10.0, created_by=SELLER))
+    db.commit()
+    db.close()
+    return factory
+
+
+@pytest.fixture
+def client(session_factory):
+    app = FastAPI()
+    app.include_router(review_routes.router)
+    app.state.user_id = 2
+    app.dependency_overrides[get_current_principal] = lambda: TokenPrincipal(
+        id=app.state.user_id, email=f"user{app.state.user_id}@example.com",
+        auth_provider="email", jti=None, expires_at=None
+    )
+    return TestClient(app)
+
+
+def _as(client, user_id):
+    client.app.state.user_id = user_id
+    return client
+
+
+def _product(session_factory):
+    db = session_factory()
+    try:
+        product = db.get(Product, 1)
+        return product.rating, product.review_count, product.rating_total
+    finally:
+        db.close()
+
+
+def test_running_sums_follow_creates_updates_and_deletes(client, session_factory):
+    assert _as(client, 2).post("/api/products/1/reviews", json={"rating": 4}).status_code == 201
+    third = _as(client, 3).post("/api/products/1/reviews", json={"rating": 1}).json()
+    assert _product(session_factory) == (2.5, 2, 5.0)
+
+    assert client.put(f"/api/products/1/reviews/{third['id']}", json={"rating": 5}).status_code == 200
+    assert _product(session_factory) == (4.5, 2, 9.0)
+    # A comment-only edit leaves the sums alone
+    client.put(f"/api/products/1/reviews/{third['id']}", json={"comment": "Bright"})
+    assert _product(session_factory) == (4.5, 2, 9.0)
+
+    assert client.delete(f"/api/products/1/reviews/{third['id']}").status_code == 204
+    assert _product(session_factory) == (4.0, 1, 4.0)
+
+
+def test_deleting_the_last_review_restores_the_default_rating(client, session_factory):
+    review = _as(client, 2).post("/api/products/1/reviews", json={"rating": 2}).json()
+    client.delete(f"/api/products/1/reviews/{review['id']}")
+    assert _product(session_factory) == (reviews.DEFAULT_RATING, 0, 0.0)
+
+
+def test_owner_and_duplicate_reviews_are_rejected(client, session_factory):
+    assert _as(client, SELLER).post("/api/products/1/reviews", json={"rating": 5}).status_code == 403
+
+    assert _as(client, 2).post("/api/products/1/reviews", json={"rating": 5}).status_code == 201
+    duplicate = client.post("/api/products/1/reviews", json={"rating": 1})
+    assert duplicate.status_code == 409
+    assert _product(session_factory) == (5.0, 1, 5.0)
+
+    # Only the author may change or remove a review
+    review_id = client.get("/api/products/1/reviews").json()["items"][0]["id"]
+    assert _as(client, 3).put(f"/api/products/1/reviews/{review_id}", json={"rating": 1}).status_code == 403
+    assert client.delete(f"/api/products/1/reviews/{review_id}").status_code == 403
+
+
+def test_pages_walk_newest_first_without_gaps_or_repeats(client):
+    for user_id in range(2, 27):
+        _as(client, user_id).post("/api/products/1/reviews", json={"rating": 3})
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 10} if cursor is None else {"limit": 10, "before_id": cursor}
+        page = client.get("/api/products/1/reviews", params=params).json()
+        ids = [item["id"] for item in page["items"]]
+        seen += ids
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+        assert cursor == ids[-1]
+
+    assert pages == 3
+    assert len(seen) == 25 and seen == sorted(seen, reverse=True)
+
+
+def test_cursor_boundaries(client):
+    for user_id in range(2, 6):
+        _as(client, user_id).post("/api/products/1/reviews", json={"rating": 3})
+    ids = [item["id"] for item in client.get("/api/products/1/reviews").json()["items"]]
+
+    # A page that exactly fills the limit has no next cursor
+    exact = client.get("/api/products/1/reviews", params={"limit": 4}).json()
+    assert exact["next_cursor"] is None and len(exact["items"]) == 4
+
+    # before_id is exclusive
+    rest = client.get("/api/products/1/reviews", params={"before_id": ids[1]}).json()
+    assert [item["id"] for item in rest["items"]] == ids[2:]
+    assert client.get("/api/products/1/reviews", params={"before_id": ids[-1]}).json() == {
+        "items": [], "next_cursor": None
+    }
+    assert client.get("/api/products/1/reviews", params={"limit": 0}).status_code == 422
+
+
+def test_recompute_corrects_drift_in_batches(client, session_factory):
+    db = session_factory()
+    db.add_all([
+        Product(id=2, name="Rug", category="Home", price=20.0, created_by=SELLER),
+        Product(id=3, name="Mug", category="Kitchen", price=5.0, created_by=SELLER),
+    ])
+    db.commit()
+    for product_id, user_id, rating in [(1, 2, 4), (1, 3, 2), (3, 2, 5)]:
+        _as(client, user_id).post(f"/api/products/{product_id}/reviews", json={"rating": rating})
+
+    # Knock the running sums out of step with the reviews table
+    db.get(Product, 1).review_count = 7
+    db.get(Product, 2).rating_total = 12.0
+    db.query(Review).filter(Review.product_id == 3).delete()
+    db.commit()
+
+    assert reviews.recompute_ratings(db, 0, 2) == 2
+    assert reviews.recompute_ratings(db, 2, 2) == 3
+    assert reviews.recompute_ratings(db, 3, 2) is None
+    db.close()
+
+    assert _product(session_factory) == (3.0, 2, 6.0)
+    db = session_factory()
+    try:
+        rug, mug = db.get(Product, 2), db.get(Product, 3)
+        assert (rug.rating, rug.review_count, rug.rating_total) == (reviews.DEFAULT_RATING, 0, 0.0)
+        assert (mug.rating, mug.review_count, mug.rating_total) == (reviews.DEFAULT_RATING, 0, 0.0)
+    finally:
+        db.close()
+
+
+def test_run_rating_recompute_walks_every_batch(session_factory, monkeypatch):
+    monkeypatch.setattr(reviews, "SessionLocal", session_factory)
+    monkeypatch.setattr(reviews.settings, "RATING_RECOMPUTE_BATCH_SIZE", 2)
+    monkeypatch.setattr(reviews.settings, "RATING_RECOMPUTE_BATCH_PAUSE_MS", 0)
+    db = session_factory()
+    db.add_all([
+        Product(id=i, name=f"Item {i}", category="Home", price=1.0, created_by=SELLER, review_count=3)
+        for i in range(2, 6)
+    ])
+    db.commit()
+    db.close()
+
+    assert reviews.run_rating_recompute() == 3
+    db = session_factory()
+    try:
+        assert [p.review_count for p in db.query(Product).order_by(Product.id)] == [0] * 5
+    finally:
+        db.close()
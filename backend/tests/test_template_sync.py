@@ -0,0 +1,49 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from routes import templates
+
+
+@pytest.fixture
+def syncs(tmp_path, monkeypatch):
+    """Replace the GitHub sync with one that takes a while and records its calls"""
+    monkeypatch.setattr(templates, "METADATA_FILE", tmp_path / "_metadata.json")
+    calls = []
+
+    async def fake_sync():
+        calls.append(asyncio.get_running_loop())
+        await asyncio.sleep(0.2)
+        templates.save_metadata({"last_sync": None, "status": "synced", "file_count": 0, "generation": len(calls)})
+
+    monkeypatch.setattr(templates, "_sync", fake_sync)
+    return calls
+
+
+def test_manual_sync_shares_the_lock_with_ensure_synced(syncs):
+    app = FastAPI()
+    app.include_router(templates.router)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            async def ensure_after_trigger():
+                # Let the manual sync mark the cache "syncing" and take the lock first
+                await asyncio.sleep(0.05)
+                await templates.ensure_synced()
+
+            response, _ = await asyncio.wait_for(
+                asyncio.gather(client.post("/templates/sync"), ensure_after_trigger()), timeout=5
+            )
+            assert response.status_code == 200
+            # A second manual sync once the first has released the lock
+            assert (await client.post("/templates/sync")).status_code == 200
+        return asyncio.get_running_loop()
+
+    loop = asyncio.run(run())
+    # ensure_synced waited for the manual sync rather than starting its own,
+    # and every sync ran on the request's event loop
+    assert len(syncs) == 2
+    assert all(sync_loop is loop for sync_loop in syncs)
+    assert templates.get_metadata()["status"] == "synced"
@@ -0,0 +1,135 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from jose import JWTError, jwt
+
+import database
+from config import settings
+from database import Base, SessionLocal
+from models.revoked_token import RevokedToken
+from routes import auth
+from utils import tokens
+from utils.tokens import DecodedTokenCache, KeySet, RevocationList
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(tokens, "key_set", KeySet())
+    monkeypatch.setattr(tokens, "token_cache", DecodedTokenCache(16))
+    monkeypatch.setattr(tokens, "revocation_list", RevocationList())
+    monkeypatch.setattr(auth, "revocation_list", tokens.revocation_list)
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=database.engine)
+    session = SessionLocal()
+    session.query(RevokedToken).delete()
+    session.commit()
+    yield session
+    session.close()
+
+
+def _write_key(path, mtime):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    path.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ))
+    os.utime(path, (mtime, mtime))
+
+
+def test_key_rotation(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ALGORITHM", "RS256")
+    monkeypatch.setattr(settings, "JWT_KEYS_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "JWT_ACTIVE_KID", "")
+    monkeypatch.setattr(settings, "JWT_KEYSET_REFRESH_SECONDS", 0)
+    _write_key(tmp_path / "2026-01.pem", 1000)
+
+    old_token = tokens.encode_token({"sub": "a@example.com", "uid": 1})
+    assert jwt.get_unverified_header(old_token)["kid"] == "2026-01"
+
+    # A newer key file takes over signing; tokens from the old key still verify
+    _write_key(tmp_path / "2026-02.pem", 2000)
+    new_token = tokens.encode_token({"sub": "a@example.com", "uid": 1})
+    assert jwt.get_unverified_header(new_token)["kid"] == "2026-02"
+    assert tokens.decode_token(old_token)["uid"] == 1
+
+    # Retiring the old key rejects its tokens (once they're out of the claims cache)
+    (tmp_path / "2026-01.pem").unlink()
+    monkeypatch.setattr(tokens, "token_cache", DecodedTokenCache(16))
+    with pytest.raises(JWTError):
+        tokens.decode_token(old_token)
+    assert tokens.decode_token(new_token)["sub"] == "a@example.com"
+
+
+def test_revoked_token_is_rejected_and_revoking_twice_is_fine(db):
+    token = tokens.encode_token({"sub": "a@example.com", "uid": 1})
+    claims = tokens.decode_token(token)
+    expires_at = datetime.utcfromtimestamp(claims["exp"])
+
+    tokens.revocation_list.revoke(db, claims["jti"], expires_at)
+    # A second logout with the same token, on another session (another worker)
+    other = SessionLocal()
+    try:
+        tokens.revocation_list.revoke(other, claims["jti"], expires_at)
+    finally:
+        other.close()
+
+    with pytest.raises(JWTError):
+        tokens.decode_token(token)
+    assert db.query(RevokedToken).count() == 1
+
+
+def test_reload_is_read_only_and_purge_drops_expired_rows(db):
+    now = datetime.utcnow()
+    db.add_all([
+        RevokedToken(jti="live", expires_at=now + timedelta(hours=1)),
+        RevokedToken(jti="expired", expires_at=now - timedelta(hours=1)),
+    ])
+    db.commit()
+
+    revocations = RevocationList()
+    revocations.reload(db)
+    assert revocations.is_revoked("live") and not revocations.is_revoked("expired")
+    assert db.query(RevokedToken).count() == 2
+
+    assert tokens.purge_revocations() == 1
+    assert [row.jti for row in db.query(RevokedToken)] == ["live"]
+
+
+def test_logout_without_token_id_is_refused(db):
+    app = FastAPI()
+    app.include_router(auth.router)
+    kid, key = tokens.key_set.signing_key()
+    legacy = jwt.encode(
+        {"sub": "a@example.com", "uid": 1, "exp": datetime.utcnow() + timedelta(hours=1)},
+        key, algorithm=settings.ALGORITHM, headers={"kid": kid},
+    )
+    client = TestClient(app)
+
+    response = client.post("/api/auth/logout", headers={"Authorization": f"Bearer {legacy}"})
+    assert response.status_code == 400
+
+    token = tokens.encode_token({"sub": "a@example.com", "uid": 1})
+    assert client.post("/api/auth/logout", headers={"Authorization": f"Bearer {token}"}).status_code == 204
+    assert client.post("/api/auth/logout", headers={"Authorization": f"Bearer {token}"}).status_code == 401
+
+
+def test_claims_cache_is_lru_and_drops_expired_entries():
+    cache = DecodedTokenCache(2)
+    exp = time.time() + 60
+    cache.put("a", {"exp": exp})
+    cache.put("b", {"exp": exp})
+    assert cache.get("a") is not None  # "b" is now the least recently used
+    cache.put("c", {"exp": exp})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+    cache.put("old", {"exp": time.time() - 1})
+    assert cache.get("old") is None
@@ -3,6 +3,8 @@ from .auth import (
     verify_password,
     get_password_hash,
     create_access_token,
+    create_user_token,
+    get_current_principal,
     get_current_user,
 )
 
@@ -10,5 +12,7 @@ __all__ = [
     "verify_password",
     "get_password_hash",
     "create_access_token",
+    "create_user_token",
+    "get_current_principal",
     "get_current_user",
 ]
@@ -0,0 +1,145 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+from typing import List, Optional
+
+from utils.disk_cache import SingleFlight, atomic_output
+from utils.file_serving import iter_files
+
+# Supported archive formats and their media types
+ARCHIVE_FORMATS = {
+    "zip": "application/zip",
+    "tar.gz": "application/gzip",
+}
+
+# Archives built during sync live here and are never evicted
+PREBUILT_DIR_NAME = "prebuilt"
+# Archives built on request live here, evicted least-recently-used first
+ON_DEMAND_DIR_NAME = "on_demand"
+
+# Concurrent requests for the same archive share one build
+_builds = SingleFlight()
+
+
+def archive_name(path: str, archive_format: str) -> str:
+    """Stable on-disk file name for an archive of `path`"""
+    digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:16]
+    return f"{digest}.{archive_format}"
+
+
+def download_name(path: str, root_name: str, generation: int, archive_format: str) -> str:
+    """File name offered to the client in Content-Disposition"""
+    base = Path(path).name if path else root_name
+    return f"{base}-{generation}.{archive_format}"
+
+
+def write_archive(source_root: Path, path: str, destination: Path, archive_format: str):
+    """
+    Write an archive of `source_root / path` to `destination`.
+    Files are streamed from disk into the archive one at a time, and the
+    archive is written to a temp file first so readers never see a partial one.
+    """
+    base = source_root / path if path else source_root
+    # Sort for deterministic archives across rebuilds of the same generation
+    files: List[Path] = sorted(p for p in iter_files(source_root) if base in p.parents)
+
+    with atomic_output(destination) as tmp_name:
+        if archive_format == "zip":
+            with zipfile.ZipFile(tmp_name, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                for file_path in files:
+                    archive.write(file_path, str(file_path.relative_to(base)).replace('\\', '/'))
+        else:
+            with tarfile.open(tmp_name, 'w:gz') as archive:
+                for file_path in files:
+                    archive.add(file_path, arcname=str(file_path.relative_to(base)).replace('\\', '/'))
+
+
+def prebuild_archives(source_root: Path, archives_root: Path, generation: int) -> int:
+    """
+    Build archives of the root and every top-level directory for a sync
+    generation, skipping any already built. Other generations are removed
+    since they can no longer be served. Returns the number built.
+    """
+    if archives_root.exists():
+        for generation_dir in archives_root.iterdir():
+            if generation_dir.name != str(generation):
+                shutil.rmtree(generation_dir)
+
+    prebuilt_dir = archives_root / str(generation) / PREBUILT_DIR_NAME
+    paths = [""] + sorted(
+        item.name for item in source_root.iterdir()
+        if item.is_dir() and not item.name.startswith('_')
+    )
+    count = 0
+    for path in paths:
+        for archive_format in ARCHIVE_FORMATS:
+            destination = prebuilt_dir / archive_name(path, archive_format)
+            if destination.exists():
+                continue
+            write_archive(source_root, path, destination, archive_format)
+            count += 1
+    return count
+
+
+def evict_archives(on_demand_dir: Path, max_bytes: int, keep: Optional[Path] = None):
+    """Delete least-recently-used on-demand archives until under `max_bytes`"""
+    if not on_demand_dir.exists():
+        return
+    entries = []
+    total = 0
+    for archive_file in on_demand_dir.iterdir():
+        if archive_file.suffix == ".tmp":
+            continue
+        stat = archive_file.stat()
+        total += stat.st_size
+        if archive_file != keep:
+            entries.append((stat.st_mtime, stat.st_size, archive_file))
+
+    for _, size, archive_file in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            archive_file.unlink()
+            total -= size
+        except FileNotFoundError:
+            pass
+
+
+async def get_archive(
+    source_root: Path,
+    archives_root: Path,
+    generation: int,
+    path: str,
+    archive_format: str,
+    max_bytes: int,
+) -> Path:
+    """
+    Return the archive file for `path` at `generation`, building it on demand
+    (off the event loop) if it was not prebuilt during sync.
+    """
+    name = archive_name(path, archive_format)
+    generation_dir = archives_root / str(generation)
+
+    prebuilt = generation_dir / PREBUILT_DIR_NAME / name
+    if prebuilt.exists():
+        return prebuilt
+
+    on_demand_dir = generation_dir / ON_DEMAND_DIR_NAME
+    cached = on_demand_dir / name
+    if cached.exists():
+        # Touch so LRU eviction sees the access
+        now = time.time()
+        os.utime(cached, (now, now))
+        return cached
+
+    async def build() -> Path:
+        await asyncio.to_thread(write_archive, source_root, path, cached, archive_format)
+        await asyncio.to_thread(evict_archives, on_demand_dir, max_bytes, cached)
+        return cached
+
+    return await _builds.run(cached, build)
@@ -1,6 +1,6 @@
-from datetime import datetime, timedelta
+from datetime import timedelta
 from typing import Optional
-from jose import JWTError, jwt
+from jose import JWTError
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 from config import settings
 from database import get_db
 from models.user import User
+from utils.tokens import TokenPrincipal, encode_token, decode_token, principal_from_claims
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
@@ -23,33 +24,56 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password_bytes)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
+    return encode_token(data, expires_delta)
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme), 
+def create_user_token(user: User) -> str:
+    """Access token carrying the user's ID and auth provider alongside the email"""
+    return create_access_token(data={"sub": user.email, "uid": user.id, "prv": user.auth_provider})
+
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
-) -> User:
+) -> TokenPrincipal:
+    """
+    Resolve the caller from token claims alone. Only tokens issued before
+    claims carried the user ID need a DB lookup.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+        claims = decode_token(token)
+        if claims.get("sub") is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == email).first()
+    principal = principal_from_claims(claims)
+    if principal.id is None:
+        user = db.query(User).filter(User.email == principal.email).first()
+        if user is None:
+            raise credentials_exception
+        principal = TokenPrincipal(
+            id=user.id,
+            email=user.email,
+            auth_provider=user.auth_provider,
+            jti=principal.jti,
+            expires_at=principal.expires_at,
+        )
+    return principal
+
+async def get_current_user(
+    principal: TokenPrincipal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+) -> User:
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    user = db.get(User, principal.id)
     if user is None:
         raise credentials_exception
     return user
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import logging
+from collections import deque
+from datetime import timedelta
+from typing import AsyncIterator, Deque, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from config import settings
+from database import SessionLocal, engine
+from models.catalog import CatalogState, CATALOG_STATE_ID, bump_catalog_version
+from models.catalog_event import CatalogEvent
+from models.product import Product
+from schemas.product import ProductResponse
+from utils.locks import try_advisory_lock
+from utils.product_cache import product_cache
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_CREATED = "product.created"
+PRODUCT_UPDATED = "product.updated"
+PRODUCT_DELETED = "product.deleted"
+
+# Tells clients to reconnect after 3 s if the stream drops
+RETRY_FRAME = b"retry: 3000\n\n"
+HEARTBEAT_FRAME = b": keep-alive\n\n"
+
+
+def publish_product_event(db: Session, event_type: str, product: Product) -> int:
+    """
+    Bump the catalog version and record the change in the outbox, both inside
+    the caller's transaction. Returns the event ID (the new catalog version).
+    """
+    db.flush()
+    bump_catalog_version(db)
+    db.flush()
+    version = db.query(CatalogState.version).filter(CatalogState.id == CATALOG_STATE_ID).scalar()
+    if event_type == PRODUCT_DELETED:
+        data = {"id": product.id}
+    else:
+        data = {"product": jsonable_encoder(ProductResponse.model_validate(product))}
+    db.add(CatalogEvent(id=version, event_type=event_type, data=json.dumps(data, separators=(",", ":"))))
+    return version
+
+
+def format_event(event_id: int, event_type: str, data: str) -> bytes:
+    return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n".encode("utf-8")
+
+
+class CatalogEventBroadcaster:
+    """
+    Fans catalog events out to every SSE connection on this worker.
+
+    One poller per worker reads new rows from the `catalog_events` outbox, which
+    is what carries events between workers. Each event is formatted once into a
+    bounded replay buffer. Connections keep only their last event ID and wait
+    on a shared future, so idle connections cost next to nothing and one publish
+    wakes them all. A client whose Last-Event-ID has fallen out of the buffer
+    gets a `reset` event and should refetch the catalog.
+    """
+
+    def __init__(self, buffer_size: int):
+        self._buffer: Deque[Tuple[int, bytes]] = deque(maxlen=buffer_size)
+        # Every event with an ID above this is in the buffer
+        self._complete_after = 0
+        self.latest_id = 0
+        self.subscribers = 0
+        self._published: Optional[asyncio.Future] = None
+
+    def _waiter(self) -> asyncio.Future:
+        if self._published is None or self._published.done():
+            self._published = asyncio.get_running_loop().create_future()
+        return self._published
+
+    def append(self, rows: List[Tuple[int, str, str]]):
+        """Buffer new events (in ID order) and wake every connection"""
+        for event_id, event_type, data in rows:
+            if event_id <= self.latest_id:
+                continue
+            if len(self._buffer) == self._buffer.maxlen:
+                self._complete_after = self._buffer[0][0]
+            self._buffer.append((event_id, format_event(event_id, event_type, data)))
+            self.latest_id = event_id
+        if rows and self._published is not None and not self._published.done():
+            self._published.set_result(None)
+
+    def since(self, last_id: int) -> Optional[List[Tuple[int, bytes]]]:
+        """Buffered events after `last_id`, or None if some are no longer buffered"""
+        if last_id < self._complete_after:
+            return None
+        events = []
+        # Connections are usually one or two events behind; walk from the end
+        for event_id, frame in reversed(self._buffer):
+            if event_id <= last_id:
+                break
+            events.append((event_id, frame))
+        events.reverse()
+        return events
+
+    async def stream(self, last_event_id: Optional[int]) -> AsyncIterator[bytes]:
+        self.subscribers += 1
+        try:
+            yield RETRY_FRAME
+            cursor = self.latest_id if last_event_id is None else last_event_id
+            while True:
+                # Taken before reading the buffer so no publish can slip in between
+                waiter = self._waiter()
+                events = self.since(cursor)
+                if events is None:
+                    cursor = self.latest_id
+                    yield format_event(cursor, "reset", "{}")
+                    continue
+                if events:
+                    cursor = events[-1][0]
+                    yield b"".join(frame for _, frame in events)
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter), settings.CATALOG_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT_FRAME
+        finally:
+            self.subscribers -= 1
+
+    def _load_recent(self):
+        """Warm the buffer from the outbox so clients can resume across restarts"""
+        db = SessionLocal()
+        try:
+            version = db.query(CatalogState.version).filter(CatalogState.id == CATALOG_STATE_ID).scalar() or 0
+            rows = db.query(CatalogEvent.id, CatalogEvent.event_type, CatalogEvent.data).filter(
+                CatalogEvent.id > version - self._buffer.maxlen
+            ).order_by(CatalogEvent.id).all()
+        finally:
+            db.close()
+        # Older events may have been purged, so resuming from before these needs a reset
+        self._complete_after = rows[0][0] - 1 if rows else version
+        self.latest_id = self._complete_after
+        return rows
+
+    def _fetch_new(self, after_id: int) -> List[Tuple[int, str, str]]:
+        db = SessionLocal()
+        try:
+            return db.query(CatalogEvent.id, CatalogEvent.event_type, CatalogEvent.data).filter(
+                CatalogEvent.id > after_id
+            ).order_by(CatalogEvent.id).limit(self._buffer.maxlen).all()
+        finally:
+            db.close()
+
+    async def run(self):
+        self.append(await asyncio.to_thread(self._load_recent))
+        interval = settings.CATALOG_EVENTS_POLL_MS / 1000
+        purge_every = max(int(settings.CATALOG_EVENTS_RETENTION_MINUTES * 60 / interval / 4), 1)
+        polls = 0
+        while True:
+            try:
+                rows = await asyncio.to_thread(self._fetch_new, self.latest_id)
+                self.append(rows)
+                # Carries writes made by other workers to this worker's product cache
+                product_cache.apply_events(rows)
+                if len(rows) == self._buffer.maxlen:
+                    # More are waiting; keep reading without sleeping
+                    continue
+            except Exception:
+                logger.exception("Catalog event poll failed")
+            polls += 1
+            if polls % purge_every == 0:
+                try:
+                    await asyncio.to_thread(purge_catalog_events)
+                except Exception:
+                    logger.exception("Catalog event purge failed")
+            await asyncio.sleep(interval)
+
+
+def purge_catalog_events() -> int:
+    """Delete outbox rows older than CATALOG_EVENTS_RETENTION_MINUTES"""
+    with try_advisory_lock(engine, "catalog_events_purge") as acquired:
+        if not acquired:
+            return 0
+        db = SessionLocal()
+        try:
+            # The database's clock, since it set created_at
+            cutoff = db.query(func.now()).scalar() - timedelta(minutes=settings.CATALOG_EVENTS_RETENTION_MINUTES)
+            purged = db.query(CatalogEvent).filter(
+                CatalogEvent.created_at < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+            return purged
+        finally:
+            db.close()
+
+
+catalog_broadcaster = CatalogEventBroadcaster(settings.CATALOG_EVENTS_BUFFER_SIZE)
+
+
+async def catalog_event_task():
+    """Background task that feeds this worker's catalog event stream"""
+    await catalog_broadcaster.run()
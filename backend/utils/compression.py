@@ -0,0 +1,218 @@
+import gzip
+import hashlib
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from starlette.responses import Response
+
+from config import settings
+
+try:
+    import brotli
+except ImportError:  # optional: br is simply not offered
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional: zstd is simply not offered
+    zstandard = None
+
+# Server preference when the client weighs encodings equally
+SUPPORTED_ENCODINGS = [
+    encoding for encoding, available in (
+        ("zstd", zstandard is not None),
+        ("br", brotli is not None),
+        ("gzip", True),
+    ) if available
+]
+
+# Levels used for payloads that are compressed once and then reused
+STATIC_LEVELS = {"gzip": 9, "br": 11, "zstd": 19}
+
+
+def accepted_encodings(accept_encoding: Optional[str]) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into {coding: q}"""
+    result = {}
+    if not accept_encoding:
+        return result
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        result[coding] = q
+    return result
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best supported encoding for an Accept-Encoding header, or None"""
+    accepted = accepted_encodings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        q = accepted.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def dynamic_level(encoding: str) -> int:
+    """Compression level for per-request (uncached) responses"""
+    return {
+        "gzip": settings.COMPRESSION_GZIP_LEVEL,
+        "br": settings.COMPRESSION_BROTLI_LEVEL,
+        "zstd": settings.COMPRESSION_ZSTD_LEVEL,
+    }[encoding]
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    """Compress a complete body"""
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class StreamCompressor:
+    """Incremental compressor for streamed response bodies"""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        if self.encoding == "zstd":
+            return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def dump_json(content: Any) -> bytes:
+    """Serialize like FastAPI's JSONResponse does"""
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class CachedPayload:
+    """A rendered body plus its compressed forms, each produced at most once"""
+
+    def __init__(self, body: bytes, media_type: str):
+        self.body = body
+        self.media_type = media_type
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        self.encoded: Dict[str, bytes] = {}
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+    def get_encoded(self, encoding: str) -> bytes:
+        if encoding not in self.encoded:
+            self.encoded[encoding] = compress(self.body, encoding, STATIC_LEVELS[encoding])
+        return self.encoded[encoding]
+
+
+class PayloadCache:
+    """
+    LRU cache of response payloads keyed by (key, version). A payload is
+    rendered and compressed once per version, so serving it again costs
+    neither serialization nor compression. Safe to use from worker threads.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        key: Hashable,
+        version: Hashable,
+        build: Callable[[], bytes],
+        media_type: str = "application/json",
+    ) -> CachedPayload:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        # Built outside the lock; a concurrent miss may build it twice
+        payload = CachedPayload(build(), media_type)
+        with self._lock:
+            self._entries[key] = (version, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return payload
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+payload_cache = PayloadCache(settings.COMPRESSION_CACHE_ENTRIES)
+
+
+def payload_response(
+    payload: CachedPayload,
+    request_headers,
+    cache_control: str = "no-cache",
+) -> Response:
+    """
+    Serve a cached payload in the best encoding the client accepts, answering
+    conditional requests with 304. The compression middleware passes these
+    through untouched because Content-Encoding is already set.
+    """
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        known = {payload.etag()} | {payload.etag(encoding) for encoding in SUPPORTED_ENCODINGS}
+        if tags & known:
+            headers["ETag"] = payload.etag()
+            return Response(status_code=304, headers=headers)
+
+    encoding = negotiate_encoding(request_headers.get("accept-encoding"))
+    if encoding is not None and len(payload.body) >= settings.COMPRESSION_MIN_SIZE:
+        headers["ETag"] = payload.etag(encoding)
+        headers["Content-Encoding"] = encoding
+        return Response(payload.get_encoded(encoding), media_type=payload.media_type, headers=headers)
+
+    headers["ETag"] = payload.etag()
+    return Response(payload.body, media_type=payload.media_type, headers=headers)
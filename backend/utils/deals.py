@@ -0,0 +1,126 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models.product import Product
+from utils.catalog_events import publish_product_event, PRODUCT_UPDATED
+
+logger = logging.getLogger(__name__)
+
+# Wait this long before retrying expiries that failed to apply
+EXPIRY_RETRY_SECONDS = 30
+
+
+def expire_deals(db: Session, product_ids: List[int], now: datetime) -> int:
+    """
+    Clear the deal on those of `product_ids` whose deal has ended.
+
+    The end time is re-checked under a row lock, so entries for deals that
+    were extended, removed or already expired by another worker change nothing.
+    """
+    expired = db.query(Product).filter(
+        Product.id.in_(product_ids),
+        Product.deal_ends_at <= now,
+    ).with_for_update().all()
+    for product in expired:
+        product.badge = None
+        product.deal_ends = None
+        product.deal_ends_at = None
+        # Bumps the catalog version, which invalidates cached catalog payloads
+        publish_product_event(db, PRODUCT_UPDATED, product)
+    db.commit()
+    return len(expired)
+
+
+class DealExpiryScheduler:
+    """
+    Min-heap of (deal_ends_at, product_id) for upcoming deal expiries.
+
+    The run loop sleeps until the earliest expiry and clears exactly the deals
+    that are due, so nothing sweeps the products table. Routes call
+    `schedule()` after committing a deal end time; stale entries are harmless
+    because `expire_deals` re-checks the end time in the database. Every
+    worker runs its own scheduler and loads pending deals on startup.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def schedule(self, product_id: int, ends_at: Optional[datetime]):
+        """Queue a product's deal expiry (call from the event loop)"""
+        if ends_at is None:
+            return
+        entry = (ends_at, product_id)
+        heapq.heappush(self._heap, entry)
+        # Only an earlier expiry needs to shorten the current sleep
+        if self._wakeup is not None and self._heap[0] == entry:
+            self._wakeup.set()
+
+    def pop_due(self, now: datetime) -> List[int]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[1])
+        return due
+
+    def next_due(self) -> Optional[datetime]:
+        return self._heap[0][0] if self._heap else None
+
+    def _load_pending(self):
+        """Add every product with a deal end time (read through its index)"""
+        db = SessionLocal()
+        try:
+            rows = db.query(Product.deal_ends_at, Product.id).filter(
+                Product.deal_ends_at.isnot(None)
+            ).order_by(Product.deal_ends_at).all()
+        finally:
+            db.close()
+        self._heap.extend((ends_at, product_id) for ends_at, product_id in rows)
+        heapq.heapify(self._heap)
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        await asyncio.to_thread(self._load_pending)
+        logger.info("Deal scheduler started with %d pending deal expiries", len(self._heap))
+
+        while True:
+            now = datetime.utcnow()
+            due = self.pop_due(now)
+            if due:
+                try:
+                    expired = await asyncio.to_thread(_expire_deals, due, now)
+                    if expired:
+                        logger.info("Expired %d deal(s)", expired)
+                except Exception:
+                    logger.exception("Failed to expire deals, retrying")
+                    retry_at = now + timedelta(seconds=EXPIRY_RETRY_SECONDS)
+                    for product_id in due:
+                        heapq.heappush(self._heap, (retry_at, product_id))
+                continue
+
+            next_due = self.next_due()
+            timeout = None if next_due is None else (next_due - now).total_seconds()
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+def _expire_deals(product_ids: List[int], now: datetime) -> int:
+    db = SessionLocal()
+    try:
+        return expire_deals(db, product_ids, now)
+    finally:
+        db.close()
+
+
+deal_scheduler = DealExpiryScheduler()
+
+
+async def deal_expiry_task():
+    """Background task that clears deals the moment they end"""
+    await deal_scheduler.run()
@@ -0,0 +1,61 @@
+"""
+Helpers shared by the on-disk caches (template archives, change sets,
+rendered Markdown, image thumbnails).
+"""
+import asyncio
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Hashable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+@contextmanager
+def atomic_output(destination: Path) -> Iterator[str]:
+    """
+    Yield a temp file name next to `destination`; once the block succeeds the
+    temp file replaces `destination`, so readers never see a partial file.
+    """
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=destination.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        yield tmp_name
+        os.replace(tmp_name, destination)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_atomic(destination: Path, data: bytes):
+    with atomic_output(destination) as tmp_name:
+        with open(tmp_name, 'wb') as f:
+            f.write(data)
+
+
+class SingleFlight:
+    """
+    Concurrent calls for the same key share one computation. The computation
+    runs in its own task, so a caller that is cancelled (say, a client that
+    disconnects) neither cancels it nor leaves the other callers waiting.
+    """
+
+    def __init__(self):
+        self._pending: Dict[Hashable, asyncio.Task] = {}
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._pending.get(key) is task:
+            del self._pending[key]
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._pending[key] = task
+            task.add_done_callback(lambda done: self._done(key, done))
+        return await asyncio.shield(task)
@@ -1,14 +1,21 @@
+import logging
 import aiosmtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from config import settings
 
+logger = logging.getLogger(__name__)
+
 
 async def send_otp_email(to_email: str, otp_code: str) -> bool:
     """Send OTP verification email to user"""
     
     if not settings.SMTP_USER or not settings.SMTP_PASSWORD:
-        print(f"[Email] SMTP not configured. OTP for {to_email}: {otp_code}")
+        # Never log OTP codes unless explicitly enabled for local development
+        if settings.DEV_LOG_OTP_CODES:
+            logger.warning("SMTP not configured. OTP for %s: %s", to_email, otp_code)
+        else:
+            logger.warning("SMTP not configured; OTP email to %s not sent", to_email)
         return True  # Return True for development without email config
     
     # Create message
@@ -115,8 +122,8 @@ If you didn't request this code, please ignore this email.
             password=settings.SMTP_PASSWORD,
             start_tls=True,
         )
-        print(f"[Email] OTP sent successfully to {to_email}")
+        logger.info("OTP sent to %s", to_email)
         return True
     except Exception as e:
-        print(f"[Email] Failed to send OTP to {to_email}: {e}")
+        logger.error("Failed to send OTP to %s: %s", to_email, e)
         return False
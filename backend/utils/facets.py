@@ -0,0 +1,165 @@
+import asyncio
+import bisect
+import json
+import logging
+from typing import List, Optional
+from sqlalchemy import case, func
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+from config import settings
+from database import SessionLocal, engine
+from models.facet import CategoryFacet
+from models.catalog import bump_catalog_version
+from models.product import Product
+from utils.locks import try_advisory_lock
+
+logger = logging.getLogger(__name__)
+
+# Lower bounds of the price histogram buckets; the last bucket is open-ended
+PRICE_BUCKETS = [0, 10, 25, 50, 100, 250, 500, 1000]
+
+
+def bucket_index(price: float) -> int:
+    return max(bisect.bisect_right(PRICE_BUCKETS, price) - 1, 0)
+
+
+def _facet_upsert(db: Session, category: str):
+    """INSERT of an empty facet row for `category` that leaves an existing row as it is"""
+    values = dict(category=category, product_count=0, histogram=json.dumps([0] * len(PRICE_BUCKETS)))
+    if db.get_bind().dialect.name == "mysql":
+        statement = mysql.insert(CategoryFacet).values(**values)
+        # A no-op update, so an existing row gets an exclusive lock. INSERT IGNORE
+        # would take a shared one, and two of those upgrading to FOR UPDATE deadlock.
+        return statement.on_duplicate_key_update(category=statement.inserted.category)
+    return sqlite.insert(CategoryFacet).values(**values).on_conflict_do_nothing(index_elements=["category"])
+
+
+def _locked_facet(db: Session, category: str, create: bool) -> Optional[CategoryFacet]:
+    """
+    Fetch a category's facet row FOR UPDATE, creating it if asked.
+
+    When creating, the row is upserted before it is locked: on InnoDB a FOR
+    UPDATE that finds no row takes a gap lock, and two transactions adding
+    the first product of a new category would then deadlock on their inserts.
+    """
+    if create:
+        # Write out a delete of this row made earlier in the transaction first
+        db.flush()
+        db.execute(_facet_upsert(db, category))
+    return db.query(CategoryFacet).filter(CategoryFacet.category == category).with_for_update().first()
+
+
+def _recompute_bounds(db: Session, facet: CategoryFacet):
+    """Refresh min/max from the (category, price) index after a boundary row left"""
+    db.flush()
+    facet.min_price, facet.max_price = db.query(
+        func.min(Product.price), func.max(Product.price)
+    ).filter(Product.category == facet.category).one()
+
+
+def product_added(db: Session, category: str, price: float):
+    """Account for a new product inside the caller's transaction"""
+    facet = _locked_facet(db, category, create=True)
+    histogram = json.loads(facet.histogram)
+    histogram[bucket_index(price)] += 1
+    facet.histogram = json.dumps(histogram)
+    facet.product_count += 1
+    facet.min_price = price if facet.min_price is None else min(facet.min_price, price)
+    facet.max_price = price if facet.max_price is None else max(facet.max_price, price)
+
+
+def product_removed(db: Session, category: str, price: float):
+    """Account for a deleted product inside the caller's transaction"""
+    facet = _locked_facet(db, category, create=False)
+    if facet is None:
+        return
+    if facet.product_count <= 1:
+        db.delete(facet)
+        return
+    histogram = json.loads(facet.histogram)
+    index = bucket_index(price)
+    histogram[index] = max(histogram[index] - 1, 0)
+    facet.histogram = json.dumps(histogram)
+    facet.product_count -= 1
+    if price in (facet.min_price, facet.max_price):
+        _recompute_bounds(db, facet)
+
+
+def product_changed(db: Session, old_category: str, old_price: float, new_category: str, new_price: float):
+    """Account for an update that moved a product's category or price"""
+    if (old_category, old_price) == (new_category, new_price):
+        return
+    product_removed(db, old_category, old_price)
+    product_added(db, new_category, new_price)
+
+
+def get_facets(db: Session) -> List[CategoryFacet]:
+    """All facet rows; O(categories), independent of the number of products"""
+    return db.query(CategoryFacet).order_by(CategoryFacet.category).all()
+
+
+def reconcile_facets(db: Session) -> int:
+    """Rebuild every facet row from `products` (the source of truth)"""
+    bucket = case(
+        *[(Product.price >= lower, i) for i, lower in reversed(list(enumerate(PRICE_BUCKETS)))],
+        else_=0,
+    )
+    totals = {
+        category: (count, min_price, max_price)
+        for category, count, min_price, max_price in db.query(
+            Product.category, func.count(Product.id), func.min(Product.price), func.max(Product.price)
+        ).group_by(Product.category)
+    }
+    histograms = {category: [0] * len(PRICE_BUCKETS) for category in totals}
+    for category, index, count in db.query(
+        Product.category, bucket, func.count(Product.id)
+    ).group_by(Product.category, bucket):
+        histograms[category][index] = count
+
+    existing = {facet.category: facet for facet in db.query(CategoryFacet).with_for_update()}
+    changed = False
+    for category, facet in existing.items():
+        if category not in totals:
+            db.delete(facet)
+            changed = True
+    for category, (count, min_price, max_price) in totals.items():
+        histogram = json.dumps(histograms[category])
+        facet = existing.get(category)
+        if facet is not None and (
+            facet.product_count, facet.min_price, facet.max_price, facet.histogram
+        ) == (count, min_price, max_price, histogram):
+            continue
+        if facet is None:
+            facet = CategoryFacet(category=category)
+            db.add(facet)
+        facet.product_count = count
+        facet.min_price = min_price
+        facet.max_price = max_price
+        facet.histogram = histogram
+        changed = True
+    if changed:
+        # Cached facet payloads are keyed by catalog version
+        bump_catalog_version(db)
+    db.commit()
+    return len(totals)
+
+
+def run_facet_reconcile() -> int:
+    with try_advisory_lock(engine, "facet_reconcile") as acquired:
+        if not acquired:
+            return 0
+        db = SessionLocal()
+        try:
+            return reconcile_facets(db)
+        finally:
+            db.close()
+
+
+async def facet_reconcile_task():
+    """Background task that corrects any drift in the incremental facets"""
+    while True:
+        try:
+            await asyncio.to_thread(run_facet_reconcile)
+        except Exception:
+            logger.exception("Facet reconcile failed")
+        await asyncio.sleep(settings.FACET_RECONCILE_INTERVAL_MINUTES * 60)
@@ -0,0 +1,263 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import mimetypes
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from starlette.background import BackgroundTask
+from starlette.responses import FileResponse, Response, StreamingResponse
+
+from utils.compression import accepted_encodings
+from utils.disk_cache import write_atomic
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are always produced
+    brotli = None
+
+# Files smaller than this are not worth precompressing
+MIN_COMPRESS_SIZE = 1024
+CHUNK_SIZE = 64 * 1024
+
+# Encodings in server preference order, with the suffix used for the variant file
+VARIANT_ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+# mimetypes gets several source extensions wrong (.ts is "video/mp2t") or
+# does not know them at all, so pin the ones the template tree contains.
+CONTENT_TYPE_OVERRIDES = {
+    '.md': 'text/markdown',
+    '.ts': 'text/plain',
+    '.tsx': 'text/plain',
+    '.jsx': 'text/plain',
+    '.py': 'text/x-python',
+    '.toml': 'text/plain',
+    '.cfg': 'text/plain',
+    '.ini': 'text/plain',
+    '.env': 'text/plain',
+    '.yml': 'text/yaml',
+    '.yaml': 'text/yaml',
+    '.sh': 'text/x-shellscript',
+    '.bat': 'text/plain',
+    '.sql': 'text/x-sql',
+    '.gitignore': 'text/plain',
+}
+
+
+def guess_content_type(path: Path) -> str:
+    """Content type for a cached file (Starlette adds the charset for text/*)"""
+    extension = path.suffix.lower() or path.name.lower()
+    content_type = CONTENT_TYPE_OVERRIDES.get(extension)
+    if content_type is None:
+        content_type = mimetypes.guess_type(path.name)[0] or 'text/plain'
+    return content_type
+
+
+def hash_file(path: Path) -> str:
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_files(root: Path) -> Iterator[Path]:
+    """Yield cached template files, skipping internal `_`-prefixed entries"""
+    for path in root.rglob('*'):
+        relative = path.relative_to(root)
+        if relative.parts[0].startswith('_') or not path.is_file():
+            continue
+        yield path
+
+
+def build_file_index(root: Path, variants_dir: Path) -> Dict[str, dict]:
+    """
+    Hash every cached file and write precompressed variants next to the cache.
+    Runs once per sync so requests never pay for hashing or compression.
+    """
+    index = {}
+    for path in iter_files(root):
+        relative_path = str(path.relative_to(root)).replace('\\', '/')
+        stat = path.stat()
+        entry = {
+            "sha256": hash_file(path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "encodings": [],
+        }
+
+        if stat.st_size >= MIN_COMPRESS_SIZE:
+            data = path.read_bytes()
+            for encoding, suffix in VARIANT_ENCODINGS:
+                if encoding == "br":
+                    if brotli is None:
+                        continue
+                    compressed = brotli.compress(data, quality=11)
+                else:
+                    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+                # Only keep variants that actually save bytes
+                if len(compressed) >= stat.st_size:
+                    continue
+                variant_path = variants_dir / (relative_path + suffix)
+                variant_path.parent.mkdir(parents=True, exist_ok=True)
+                variant_path.write_bytes(compressed)
+                entry["encodings"].append(encoding)
+
+        index[relative_path] = entry
+    return index
+
+
+def load_index(index_file: Path) -> Dict[str, dict]:
+    """Load the file index written at sync time"""
+    if index_file.exists():
+        with open(index_file, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def save_index(index_file: Path, index: Dict[str, dict]):
+    """Write the file index atomically"""
+    write_atomic(index_file, json.dumps(index).encode('utf-8'))
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match / If-Range header against an ETag"""
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in header.split(',')]
+    return etag in candidates or f'W/{etag}' in candidates
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single `bytes=` range into an inclusive (start, end) pair.
+    Returns None when the header should be ignored (malformed or multi-range,
+    which we answer with the full body) and raises ValueError when the range
+    cannot be satisfied.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    start_text, sep, end_text = spec.strip().partition('-')
+    if not sep:
+        return None
+    try:
+        start = int(start_text) if start_text else None
+        end = int(end_text) if end_text else None
+    except ValueError:
+        return None
+
+    if start is None:
+        # Suffix range: the last N bytes
+        if not end:
+            raise ValueError("Range not satisfiable")
+        return max(size - end, 0), size - 1
+    if end is None:
+        end = size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, size - 1)
+
+
+def _iter_file_range(path: Path, start: int, end: int) -> Iterator[bytes]:
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def serve_file(
+    path: Path,
+    variants_path: Optional[Path],
+    entry: Optional[dict],
+    request_headers,
+    cache_control: str = "no-cache",
+    background: Optional[BackgroundTask] = None,
+) -> Response:
+    """
+    Build a response for a cached file honouring conditional requests, Range
+    and precompressed variants. Bodies are streamed from disk, never loaded
+    into memory. A file the sync-time index doesn't match is hashed in a
+    worker thread so the event loop keeps serving other requests.
+    """
+    stat = path.stat()
+    if entry and entry.get("size") == stat.st_size:
+        sha256 = entry["sha256"]
+    else:
+        sha256 = await asyncio.to_thread(hash_file, path)
+    etag = f'"{sha256}"'
+    content_type = guess_content_type(path)
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept-Encoding",
+    }
+
+    # Revalidation succeeds against any representation of the same content
+    if_none_match = request_headers.get("if-none-match")
+    if etag_matches(if_none_match, etag) or any(
+        etag_matches(if_none_match, f'"{sha256}-{encoding}"') for encoding, _ in VARIANT_ENCODINGS
+    ):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request_headers.get("range")
+    if range_header and (
+        not request_headers.get("if-range") or request_headers.get("if-range").strip() == etag
+    ):
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{stat.st_size}"},
+            )
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(
+                _iter_file_range(path, start, end),
+                status_code=206,
+                media_type=content_type,
+                headers=headers,
+                background=background,
+            )
+
+    # Whole-body requests can use a precompressed variant if the client accepts it
+    if variants_path is not None and entry:
+        accepted = accepted_encodings(request_headers.get("accept-encoding"))
+        for encoding, suffix in VARIANT_ENCODINGS:
+            if encoding not in entry.get("encodings", []) or accepted.get(encoding, 0) <= 0:
+                continue
+            variant_file = variants_path.with_name(variants_path.name + suffix)
+            if not variant_file.exists():
+                continue
+            # A strong ETag must differ between representations
+            headers["ETag"] = f'"{sha256}-{encoding}"'
+            headers["Content-Encoding"] = encoding
+            headers.pop("Accept-Ranges")
+            return FileResponse(
+                variant_file,
+                media_type=content_type,
+                headers=headers,
+                background=background,
+            )
+
+    return FileResponse(
+        path,
+        media_type=content_type,
+        headers=headers,
+        stat_result=stat,
+        background=background,
+    )
@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import aiohttp
+from google.auth import jwt as google_jwt
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+# Used when Google's response carries no usable max-age
+DEFAULT_CERTS_MAX_AGE = 300
+# Refresh this far into the max-age window so requests never wait on a fetch
+REFRESH_AT_FRACTION = 0.8
+# ...but never sooner than this, even for responses with no usable lifetime
+MIN_REFRESH_SECONDS = 10
+CLOCK_SKEW_SECONDS = 10
+# A token signed with a key the cached certs lack triggers a refetch (Google
+# rotated its keys early), but at most this often so made-up key IDs can't
+# turn every sign-in into a call to Google
+UNKNOWN_KEY_REFETCH_SECONDS = 30
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+class GoogleCertsUnavailable(Exception):
+    """Raised when no certificates are cached and Google cannot be reached"""
+
+
+def cache_lifetime(cache_control: Optional[str], age: Optional[str]) -> int:
+    """Seconds a certs response may be reused, from Cache-Control max-age minus Age"""
+    match = _MAX_AGE_RE.search(cache_control or "")
+    if not match:
+        return DEFAULT_CERTS_MAX_AGE
+    lifetime = int(match.group(1))
+    if age and age.isdigit():
+        lifetime -= int(age)
+    return max(lifetime, 0)
+
+
+class GoogleCertCache:
+    """
+    Google's ID token signing certificates, fetched over a pooled session and
+    reused for as long as Cache-Control allows. A background task refreshes
+    them before they expire; stale certs keep being served if a refresh fails.
+    """
+
+    def __init__(self, certs_url: str):
+        self.certs_url = certs_url
+        self._certs: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        return self._session
+
+    async def _fetch(self):
+        async with self._get_session().get(self.certs_url) as response:
+            if response.status != 200:
+                raise GoogleCertsUnavailable(f"Certificate endpoint returned {response.status}")
+            certs = await response.json(content_type=None)
+            lifetime = cache_lifetime(
+                response.headers.get("Cache-Control"),
+                response.headers.get("Age"),
+            )
+        self._certs = certs
+        self._fetched_at = time.monotonic()
+        self._expires_at = self._fetched_at + lifetime
+        self._schedule_refresh(lifetime)
+
+    def _schedule_refresh(self, lifetime: int):
+        current = self._refresh_task
+        if current is not None and not current.done() and current is not asyncio.current_task():
+            current.cancel()
+        delay = max(lifetime * REFRESH_AT_FRACTION, MIN_REFRESH_SECONDS)
+        self._refresh_task = asyncio.create_task(self._refresh_later(delay))
+
+    async def _refresh_later(self, delay: float):
+        await asyncio.sleep(delay)
+        async with self._lock:
+            try:
+                await self._fetch()
+            except Exception as e:
+                logger.warning("Certificate refresh failed, keeping cached certs: %s", e)
+                # Retry soon rather than waiting a whole max-age window
+                self._schedule_refresh(DEFAULT_CERTS_MAX_AGE // 10)
+
+    def _usable(self, key_id: Optional[str]) -> bool:
+        now = time.monotonic()
+        if not self._certs or now >= self._expires_at:
+            return False
+        return key_id is None or key_id in self._certs or now - self._fetched_at < UNKNOWN_KEY_REFETCH_SECONDS
+
+    async def get_certs(self, key_id: Optional[str] = None) -> Dict[str, str]:
+        """Cached certs, refetched when expired or (rate-limited) when they lack `key_id`"""
+        if self._usable(key_id):
+            return self._certs
+        async with self._lock:
+            if self._usable(key_id):
+                return self._certs
+            try:
+                await self._fetch()
+            except Exception as e:
+                if self._certs:
+                    # Expired certs are still Google's most recent ones we know of
+                    logger.warning("Certificate fetch failed, using stale certs: %s", e)
+                    return self._certs
+                raise GoogleCertsUnavailable(str(e))
+        return self._certs
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        if self._session is not None:
+            await self._session.close()
+
+
+class GoogleTokenVerifier:
+    """Verifies Google ID tokens off the event loop, caching results until they expire"""
+
+    def __init__(self, cert_cache: GoogleCertCache, max_entries: int = 1024):
+        self.cert_cache = cert_cache
+        self.max_entries = max_entries
+        self._results: "OrderedDict[str, dict]" = OrderedDict()
+
+    def _cached(self, key: str) -> Optional[dict]:
+        idinfo = self._results.get(key)
+        if idinfo is None:
+            return None
+        if idinfo.get("exp", 0) <= time.time():
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return idinfo
+
+    async def verify(self, token: str, audience: str) -> dict:
+        """Return the token's claims, raising ValueError if it is not a valid Google ID token"""
+        key = hashlib.sha256(f"{audience}:{token}".encode("utf-8")).hexdigest()
+        idinfo = self._cached(key)
+        if idinfo is not None:
+            return idinfo
+
+        key_id = google_jwt.decode_header(token).get("kid")
+        certs = await self.cert_cache.get_certs(key_id)
+        # Signature checks are CPU-bound; keep them off the event loop
+        idinfo = await asyncio.to_thread(
+            google_jwt.decode,
+            token,
+            certs=certs,
+            audience=audience,
+            clock_skew_in_seconds=CLOCK_SKEW_SECONDS,
+        )
+        if idinfo.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer: {idinfo.get('iss')}")
+
+        self._results[key] = idinfo
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+        return idinfo
+
+
+google_cert_cache = GoogleCertCache(settings.GOOGLE_CERTS_URL)
+google_token_verifier = GoogleTokenVerifier(google_cert_cache)
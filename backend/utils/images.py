@@ -0,0 +1,266 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+import ipaddress
+import os
+import socket
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+from aiohttp.resolver import ThreadedResolver
+from PIL import Image, ImageOps
+
+from config import settings
+from utils.disk_cache import SingleFlight, write_atomic
+
+# Thumbnail widths in pixels; smaller images are never upscaled
+THUMBNAIL_SIZES = {"small": 160, "card": 400, "large": 800}
+THUMBNAIL_MEDIA_TYPE = "image/webp"
+THUMBNAIL_QUALITY = 80
+
+# Source key (hash of the image URL) -> content hash of the image it resolved to
+SOURCES_DIR_NAME = "sources"
+# Thumbnails by content hash of the source image: <hash>/<size>.webp
+THUMBNAILS_DIR_NAME = "thumbnails"
+
+MAX_REDIRECTS = 3
+# Refuse to decode anything larger (decompression bombs)
+MAX_PIXELS = 40_000_000
+
+
+class ImageUnavailable(Exception):
+    """Raised when a source image cannot be fetched or decoded"""
+
+
+def source_key(source: str) -> str:
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def thumbnail_path(root: Path, content_hash: str, size: str) -> Path:
+    return root / THUMBNAILS_DIR_NAME / content_hash / f"{size}.webp"
+
+
+def make_thumbnails(data: bytes, root: Path, content_hash: str) -> int:
+    """Decode a source image, write every thumbnail size as WebP and return the bytes written"""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.width * image.height > MAX_PIXELS:
+                raise ImageUnavailable("Image is too large")
+            # Lets JPEGs decode at a reduced scale when they are far larger than needed
+            largest = max(THUMBNAIL_SIZES.values())
+            image.draft("RGB", (largest, largest * image.height // max(image.width, 1)))
+            image = ImageOps.exif_transpose(image)
+            has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageUnavailable(f"Could not decode image: {e}")
+
+    written = 0
+    for size, width in THUMBNAIL_SIZES.items():
+        thumbnail = image
+        if image.width > width:
+            height = max(round(image.height * width / image.width), 1)
+            thumbnail = image.resize((width, height), Image.LANCZOS)
+        output = io.BytesIO()
+        thumbnail.save(output, "WEBP", quality=THUMBNAIL_QUALITY, method=4)
+        write_atomic(thumbnail_path(root, content_hash, size), output.getvalue())
+        written += output.tell()
+    return written
+
+
+def evict_images(root: Path, max_bytes: int, keep: Optional[str] = None) -> int:
+    """
+    Delete least-recently-used cache files until the cache is under
+    `max_bytes` and return its size. Files under the `keep` content hash and
+    temp files of writes in progress are left alone.
+    """
+    entries = []
+    total = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.endswith(".tmp"):
+                continue
+            path = Path(dirpath) / name
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            total += stat.st_size
+            if keep is None or path.parent.name != keep:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            path.unlink()
+            total -= size
+        except FileNotFoundError:
+            continue
+        if path.parent.parent.name == THUMBNAILS_DIR_NAME:
+            try:
+                path.parent.rmdir()
+            except OSError:
+                pass
+    return total
+
+
+def decode_data_url(source: str) -> bytes:
+    """Bytes of a base64 `data:image/...` URL (how uploaded images are stored)"""
+    header, _, payload = source.partition(",")
+    if not header.startswith("data:image/") or not header.endswith(";base64"):
+        raise ImageUnavailable("Unsupported data URL")
+    try:
+        return base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        raise ImageUnavailable("Invalid data URL")
+
+
+def check_public_host(url: str):
+    """
+    Refuse URLs that aren't http(s) or name a private, loopback or link-local
+    IP address. Host names are checked when they are resolved (PublicResolver).
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ImageUnavailable("Unsupported image URL")
+    if settings.IMAGE_PROXY_ALLOW_PRIVATE_HOSTS:
+        return
+    try:
+        address = ipaddress.ip_address(parts.hostname)
+    except ValueError:
+        return
+    if not address.is_global:
+        raise ImageUnavailable(f"{parts.hostname} is not a public host")
+
+
+class PublicResolver(ThreadedResolver):
+    """
+    Resolver that refuses hosts resolving to private, loopback or link-local
+    addresses. aiohttp connects to the addresses returned here, so the check
+    applies to every connection (each redirect hop included) and a second DNS
+    answer can't swap in another address after the check (DNS rebinding).
+    """
+
+    async def resolve(self, host: str, port: int = 0, family: socket.AddressFamily = socket.AF_INET):
+        hosts = await super().resolve(host, port, family)
+        if not settings.IMAGE_PROXY_ALLOW_PRIVATE_HOSTS:
+            for result in hosts:
+                if not ipaddress.ip_address(result["host"]).is_global:
+                    raise OSError(f"{host} is not a public host")
+        return hosts
+
+
+class ImageProxy:
+    """
+    Thumbnails of product images, fetched from their origin once and kept in
+    a content-addressed on-disk cache: thumbnails are stored by the hash of
+    the source image, so the same image under different URLs is stored once.
+    The cache is LRU-evicted past IMAGE_CACHE_MAX_MB, and concurrent requests
+    for the same uncached image share one fetch.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loads = SingleFlight()
+        # Running size of the cache, so a miss only walks it when eviction is due.
+        # It doesn't see other workers' writes; the walk then corrects it.
+        self._cache_bytes: Optional[int] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(resolver=PublicResolver()),
+                timeout=aiohttp.ClientTimeout(total=settings.IMAGE_PROXY_TIMEOUT_SECONDS),
+            )
+        return self._session
+
+    async def _fetch(self, url: str) -> bytes:
+        max_bytes = settings.IMAGE_PROXY_MAX_SOURCE_MB * 1024 * 1024
+        for _ in range(MAX_REDIRECTS + 1):
+            # Redirects are followed by hand so every hop gets the URL check
+            check_public_host(url)
+            try:
+                async with self._get_session().get(url, allow_redirects=False) as response:
+                    location = response.headers.get("Location")
+                    if response.status in (301, 302, 303, 307, 308) and location:
+                        url = urljoin(url, location)
+                        continue
+                    if response.status != 200:
+                        raise ImageUnavailable(f"Origin returned {response.status}")
+                    if not response.content_type.startswith("image/"):
+                        raise ImageUnavailable(f"Origin returned {response.content_type}, not an image")
+                    if (response.content_length or 0) > max_bytes:
+                        raise ImageUnavailable("Image is too large")
+                    data = bytearray()
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        data += chunk
+                        if len(data) > max_bytes:
+                            raise ImageUnavailable("Image is too large")
+                    return bytes(data)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise ImageUnavailable(f"Could not fetch image: {e!r}")
+        raise ImageUnavailable("Too many redirects")
+
+    def _cached(self, key: str, size: str) -> Optional[Tuple[Path, str]]:
+        pointer = self.root / SOURCES_DIR_NAME / key
+        try:
+            content_hash = pointer.read_text()
+        except FileNotFoundError:
+            return None
+        path = thumbnail_path(self.root, content_hash, size)
+        if not path.exists():
+            return None
+        # Touch so LRU eviction sees the access
+        now = time.time()
+        try:
+            os.utime(pointer, (now, now))
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            return None
+        return path, content_hash
+
+    async def _load(self, source: str, key: str) -> str:
+        """Fetch (or decode) a source image, write its thumbnails and return its content hash"""
+        if source.startswith("data:"):
+            data = decode_data_url(source)
+        else:
+            data = await self._fetch(source)
+        content_hash = hashlib.sha256(data).hexdigest()
+        written = len(content_hash)
+        if not all(thumbnail_path(self.root, content_hash, size).exists() for size in THUMBNAIL_SIZES):
+            written += await asyncio.to_thread(make_thumbnails, data, self.root, content_hash)
+        await asyncio.to_thread(write_atomic, self.root / SOURCES_DIR_NAME / key, content_hash.encode('ascii'))
+        await self._account(written, content_hash)
+        return content_hash
+
+    async def _account(self, written: int, keep: str):
+        """Add a miss's writes to the cache size, evicting once it is over the limit"""
+        max_bytes = settings.IMAGE_CACHE_MAX_MB * 1024 * 1024
+        if self._cache_bytes is not None and self._cache_bytes + written <= max_bytes:
+            self._cache_bytes += written
+            return
+        self._cache_bytes = await asyncio.to_thread(evict_images, self.root, max_bytes, keep)
+
+    async def get_thumbnail(self, source: str, size: str) -> Tuple[Path, str]:
+        """Path of the `size` thumbnail of the image at `source`, and the image's content hash"""
+        key = source_key(source)
+        cached = self._cached(key, size)
+        if cached is not None:
+            return cached
+
+        content_hash = await self._loads.run(key, lambda: self._load(source, key))
+        return thumbnail_path(self.root, content_hash, size), content_hash
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+image_proxy = ImageProxy(Path(__file__).resolve().parent.parent / "image_cache")
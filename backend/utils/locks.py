@@ -0,0 +1,57 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to a per-process lock
+    fcntl = None
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+@contextmanager
+def try_advisory_lock(engine: Engine, name: str):
+    """
+    Non-blocking cluster-wide lock; yields True if this process holds it.
+
+    On MySQL this is GET_LOCK on a dedicated connection, so it covers every
+    worker on every host sharing the database. Elsewhere (SQLite in
+    development) it is a file lock, which covers workers on one host.
+    """
+    if engine.dialect.name == "mysql":
+        with engine.connect() as connection:
+            acquired = connection.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": name}).scalar() == 1
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": name})
+        return
+
+    if fcntl is not None:
+        lock_path = os.path.join(tempfile.gettempdir(), f"microsaas-{name}.lock")
+        with open(lock_path, "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return
+
+    with _local_locks_guard:
+        lock = _local_locks.setdefault(name, threading.Lock())
+    acquired = lock.acquire(blocking=False)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            lock.release()
@@ -0,0 +1,157 @@
+import asyncio
+import difflib
+import json
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.disk_cache import SingleFlight, write_atomic
+
+# Per-generation manifests of {path: content hash}
+GENERATIONS_DIR_NAME = "generations"
+# File contents by hash, kept while any retained manifest refers to them
+BLOBS_DIR_NAME = "blobs"
+# Computed change sets, one per (from, to) generation pair
+CHANGES_DIR_NAME = "changes"
+
+# Larger text files are listed as changed but get no unified diff
+MAX_DIFF_BYTES = 256 * 1024
+
+# Concurrent requests for the same change set share one computation
+_computations = SingleFlight()
+
+
+def _write_json(destination: Path, data: dict):
+    write_atomic(destination, json.dumps(data).encode('utf-8'))
+
+
+def manifest_path(history_root: Path, generation: int) -> Path:
+    return history_root / GENERATIONS_DIR_NAME / f"{generation}.json"
+
+
+def list_generations(history_root: Path) -> List[int]:
+    generations_dir = history_root / GENERATIONS_DIR_NAME
+    if not generations_dir.exists():
+        return []
+    return sorted(int(p.stem) for p in generations_dir.glob("*.json") if p.stem.isdigit())
+
+
+def load_manifest(history_root: Path, generation: int) -> Optional[dict]:
+    path = manifest_path(history_root, generation)
+    if not path.exists():
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def record_generation(
+    source_root: Path,
+    index: Dict[str, dict],
+    history_root: Path,
+    generation: int,
+    synced_at: str,
+    keep: int,
+) -> int:
+    """
+    Save the manifest for a sync generation, storing the contents of files not
+    seen before, then drop generations beyond the newest `keep` along with
+    change sets and blobs only they used. Returns the number of new blobs.
+    """
+    blobs_dir = history_root / BLOBS_DIR_NAME
+    blobs_dir.mkdir(parents=True, exist_ok=True)
+    new_blobs = 0
+    for relative_path, entry in index.items():
+        blob = blobs_dir / entry["sha256"]
+        if not blob.exists():
+            shutil.copyfile(source_root / relative_path, blob)
+            new_blobs += 1
+
+    _write_json(manifest_path(history_root, generation), {
+        "generation": generation,
+        "synced_at": synced_at,
+        "files": {path: entry["sha256"] for path, entry in sorted(index.items())},
+    })
+
+    retained = list_generations(history_root)[-keep:]
+    for old in list_generations(history_root):
+        if old not in retained:
+            manifest_path(history_root, old).unlink()
+
+    changes_dir = history_root / CHANGES_DIR_NAME
+    if changes_dir.exists():
+        for change_set in changes_dir.glob("*.json"):
+            pair = change_set.stem.split("-")
+            if not all(part.isdigit() and int(part) in retained for part in pair):
+                change_set.unlink()
+
+    referenced = set()
+    for kept in retained:
+        referenced.update(load_manifest(history_root, kept)["files"].values())
+    for blob in blobs_dir.iterdir():
+        if blob.name not in referenced:
+            blob.unlink()
+    return new_blobs
+
+
+def _read_text(blobs_dir: Path, sha256: Optional[str]) -> Optional[List[str]]:
+    """A blob's lines, or None if it is binary or too large to diff"""
+    if sha256 is None:
+        return []
+    blob = blobs_dir / sha256
+    if blob.stat().st_size > MAX_DIFF_BYTES:
+        return None
+    try:
+        return blob.read_text(encoding='utf-8').splitlines(keepends=True)
+    except UnicodeDecodeError:
+        return None
+
+
+def compute_changes(history_root: Path, from_generation: int, to_generation: int) -> dict:
+    """Paths added, removed and modified between two generations, with unified diffs"""
+    old = load_manifest(history_root, from_generation)["files"]
+    new = load_manifest(history_root, to_generation)["files"]
+    added = sorted(new.keys() - old.keys())
+    removed = sorted(old.keys() - new.keys())
+    modified = sorted(path for path in old.keys() & new.keys() if old[path] != new[path])
+
+    blobs_dir = history_root / BLOBS_DIR_NAME
+    diffs = {}
+    for path in added + removed + modified:
+        before = _read_text(blobs_dir, old.get(path))
+        after = _read_text(blobs_dir, new.get(path))
+        if before is None or after is None:
+            continue
+        diffs[path] = "".join(difflib.unified_diff(
+            before,
+            after,
+            fromfile=f"a/{path}" if path in old else "/dev/null",
+            tofile=f"b/{path}" if path in new else "/dev/null",
+        ))
+
+    return {
+        "from_generation": from_generation,
+        "to_generation": to_generation,
+        "added": added,
+        "removed": removed,
+        "modified": modified,
+        # Keyed by path; files without an entry are binary or too large to diff
+        "diffs": diffs,
+        "files": {path: new[path] for path in added + modified},
+    }
+
+
+async def get_changes(history_root: Path, from_generation: int, to_generation: int) -> Path:
+    """
+    Return the JSON file holding the change set between two generations,
+    computing it (off the event loop) the first time the pair is asked for.
+    """
+    cached = history_root / CHANGES_DIR_NAME / f"{from_generation}-{to_generation}.json"
+    if cached.exists():
+        return cached
+
+    async def compute() -> Path:
+        changes = await asyncio.to_thread(compute_changes, history_root, from_generation, to_generation)
+        await asyncio.to_thread(_write_json, cached, changes)
+        return cached
+
+    return await _computations.run(cached, compute)
@@ -0,0 +1,109 @@
+import html
+import json
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import markdown
+import nh3
+
+from utils.disk_cache import write_atomic
+
+# Bump when the rendering pipeline changes so cached renders are rebuilt
+RENDERER_VERSION = 1
+
+MARKDOWN_EXTENSIONS = {'.md'}
+
+_MARKDOWN_EXTENSIONS = ["fenced_code", "tables", "sane_lists", "toc"]
+_MARKDOWN_CONFIG = {
+    # Heading anchors: every heading gets an id and a trailing permalink
+    "toc": {"permalink": "#", "permalink_class": "heading-anchor", "toc_depth": "1-4"},
+}
+
+# Allowlist applied after rendering; raw HTML in the Markdown source passes
+# through it too, so scripts, event handlers and javascript: URLs never survive
+ALLOWED_TAGS = {
+    "a", "abbr", "b", "blockquote", "br", "code", "dd", "del", "details", "div",
+    "dl", "dt", "em", "h1", "h2", "h3", "h4", "h5", "h6", "hr", "i", "img", "kbd",
+    "li", "ol", "p", "pre", "s", "span", "strong", "sub", "summary", "sup",
+    "table", "tbody", "td", "tfoot", "th", "thead", "tr", "ul",
+}
+ALLOWED_ATTRIBUTES = {
+    "*": {"id", "title"},
+    "a": {"href", "class"},
+    "img": {"src", "alt", "width", "height"},
+    "code": {"class"},
+    "div": {"class"},
+    "span": {"class"},
+    "th": {"align"},
+    "td": {"align"},
+}
+ALLOWED_URL_SCHEMES = {"http", "https", "mailto"}
+
+
+def is_markdown(path: str) -> bool:
+    return Path(path).suffix.lower() in MARKDOWN_EXTENSIONS
+
+
+def _toc_entries(tokens: List[dict]) -> List[dict]:
+    return [
+        {
+            "level": token["level"],
+            "id": token["id"],
+            # Plain text; the toc extension hands it over HTML-escaped
+            "title": html.unescape(token["name"]),
+            "children": _toc_entries(token["children"]),
+        }
+        for token in tokens
+    ]
+
+
+def render_markdown(text: str) -> dict:
+    """Render Markdown to sanitized HTML plus a nested table of contents"""
+    md = markdown.Markdown(extensions=_MARKDOWN_EXTENSIONS, extension_configs=_MARKDOWN_CONFIG)
+    body = md.convert(text)
+    return {
+        "html": nh3.clean(
+            body,
+            tags=ALLOWED_TAGS,
+            attributes=ALLOWED_ATTRIBUTES,
+            url_schemes=ALLOWED_URL_SCHEMES,
+        ),
+        "toc": _toc_entries(md.toc_tokens),
+    }
+
+
+def rendered_path(rendered_dir: Path, sha256: str) -> Path:
+    """Where the render of a file with this content hash is stored"""
+    return rendered_dir / f"{sha256}.v{RENDERER_VERSION}.json"
+
+
+def render_markdown_files(root: Path, index: Dict[str, dict], rendered_dir: Path) -> Tuple[int, int]:
+    """
+    Render every Markdown file in the sync index, keyed by content hash.
+
+    Renders from earlier syncs are kept, so only new or changed files are
+    rendered; renders no file refers to any more are deleted. Returns
+    (rendered, reused).
+    """
+    rendered_dir.mkdir(parents=True, exist_ok=True)
+    wanted = set()
+    rendered = reused = 0
+    for relative_path, entry in index.items():
+        if not is_markdown(relative_path):
+            continue
+        target = rendered_path(rendered_dir, entry["sha256"])
+        wanted.add(target.name)
+        if target.exists():
+            reused += 1
+            continue
+        try:
+            text = (root / relative_path).read_text(encoding='utf-8')
+        except UnicodeDecodeError:
+            continue
+        write_atomic(target, json.dumps(render_markdown(text)).encode('utf-8'))
+        rendered += 1
+
+    for stale in rendered_dir.iterdir():
+        if stale.name not in wanted:
+            stale.unlink()
+    return rendered, reused
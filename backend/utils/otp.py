@@ -1,9 +1,16 @@
+import asyncio
+import logging
 import random
 import string
+import time
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from config import settings
+from database import SessionLocal, engine
 from models.otp import OTP
+from utils.locks import try_advisory_lock
+
+logger = logging.getLogger(__name__)
 
 
 def generate_otp_code() -> str:
@@ -55,3 +62,69 @@ def verify_otp(db: Session, user_id: int, code: str) -> bool:
     db.commit()
     
     return True
+
+
+def purge_otp_batch(db: Session, cutoff: datetime, batch_size: int) -> int:
+    """
+    Delete up to `batch_size` OTPs that expired before `cutoff`.
+    
+    Rows are picked oldest-first through the expires_at index and deleted by
+    primary key, so each statement touches (and locks) only that batch.
+    Used OTPs need no separate pass: every OTP expires OTP_EXPIRE_MINUTES
+    after creation, so used rows are purged once they expire too.
+    """
+    ids = [
+        otp_id for (otp_id,) in db.query(OTP.id)
+        .filter(OTP.expires_at < cutoff)
+        .order_by(OTP.expires_at)
+        .limit(batch_size)
+    ]
+    if not ids:
+        return 0
+    
+    db.query(OTP).filter(OTP.id.in_(ids)).delete(synchronize_session=False)
+    db.commit()
+    return len(ids)
+
+
+def run_otp_purge() -> int:
+    """Purge expired OTPs in paced batches; only one process runs it at a time"""
+    with try_advisory_lock(engine, "otp_purge") as acquired:
+        if not acquired:
+            return 0
+        
+        cutoff = datetime.utcnow()
+        pause = settings.OTP_PURGE_BATCH_PAUSE_MS / 1000
+        total = 0
+        batch = 0
+        db = SessionLocal()
+        try:
+            while True:
+                started = time.perf_counter()
+                purged = purge_otp_batch(db, cutoff, settings.OTP_PURGE_BATCH_SIZE)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if not purged:
+                    break
+                batch += 1
+                total += purged
+                logger.info("OTP purge batch %d: purged %d rows in %.1f ms", batch, purged, elapsed_ms)
+                if purged < settings.OTP_PURGE_BATCH_SIZE:
+                    break
+                # Give replicas and competing writers room between batches
+                time.sleep(pause)
+        finally:
+            db.close()
+        return total
+
+
+async def otp_purge_task():
+    """Background task that purges expired OTPs every OTP_PURGE_INTERVAL_MINUTES"""
+    while True:
+        await asyncio.sleep(settings.OTP_PURGE_INTERVAL_MINUTES * 60)
+        try:
+            started = time.perf_counter()
+            total = await asyncio.to_thread(run_otp_purge)
+            if total:
+                logger.info("Purged %d expired OTPs in %.2f s", total, time.perf_counter() - started)
+        except Exception:
+            logger.exception("OTP purge failed")
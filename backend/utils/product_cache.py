@@ -0,0 +1,117 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from config import settings
+from models.catalog import CatalogState, CATALOG_STATE_ID
+from models.product import Product
+from schemas.product import ProductResponse
+from utils.compression import dump_json
+
+
+def products_by_ids_statement(product_ids: List[int]):
+    """
+    The products with these IDs plus the catalog version they were read at,
+    in one statement so both come from the same snapshot.
+    """
+    version = select(CatalogState.version).where(CatalogState.id == CATALOG_STATE_ID).scalar_subquery()
+    return select(Product, version).where(Product.id.in_(product_ids))
+
+
+class ProductCache:
+    """
+    Identity map of serialized products (JSON bytes) by product ID.
+
+    Entries are stamped with the catalog version they were read at. A write
+    records the version that invalidated the product, and a read stamped
+    before that version is not cached, so a request that read a row just
+    before a write can't put the stale copy back after the write evicted it.
+    Invalidations come from the write handlers in this worker and, for writes
+    made by other workers, from the catalog event outbox poll.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Tuple[int, bytes]]" = OrderedDict()
+        # Product ID -> catalog version of its latest write, for recent writes
+        self._invalidated: "OrderedDict[int, int]" = OrderedDict()
+        # Reads stamped below this are never cached (older invalidations were forgotten)
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def get_many(self, product_ids: Iterable[int]) -> Tuple[Dict[int, bytes], List[int]]:
+        """Cached products by ID, and the IDs that missed"""
+        found: Dict[int, bytes] = {}
+        missing: List[int] = []
+        with self._lock:
+            for product_id in product_ids:
+                entry = self._entries.get(product_id)
+                if entry is None:
+                    missing.append(product_id)
+                else:
+                    self._entries.move_to_end(product_id)
+                    found[product_id] = entry[1]
+        return found, missing
+
+    def put(self, product_id: int, version: int, payload: bytes):
+        with self._lock:
+            if version < max(self._floor, self._invalidated.get(product_id, 0)):
+                return
+            current = self._entries.get(product_id)
+            if current is not None and current[0] > version:
+                return
+            self._entries[product_id] = (version, payload)
+            self._entries.move_to_end(product_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, product_id: int, version: int):
+        """Evict a product written at catalog `version`"""
+        with self._lock:
+            self._entries.pop(product_id, None)
+            if version > self._invalidated.get(product_id, 0):
+                self._invalidated[product_id] = version
+                self._invalidated.move_to_end(product_id)
+            while len(self._invalidated) > self.max_entries:
+                _, forgotten = self._invalidated.popitem(last=False)
+                self._floor = max(self._floor, forgotten)
+
+    def apply_events(self, rows: List[Tuple[int, str, str]]):
+        """Invalidate the products named in catalog outbox rows (id, type, data)"""
+        for event_id, _, data in rows:
+            event = json.loads(data)
+            product_id = event["product"]["id"] if "product" in event else event.get("id")
+            if product_id is not None:
+                self.invalidate(product_id, event_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+product_cache = ProductCache(settings.PRODUCT_CACHE_ENTRIES)
+
+
+def get_products(db: Session, product_ids: List[int]) -> Dict[int, bytes]:
+    """
+    Serialized products by ID (missing IDs are left out). Cache hits cost
+    nothing; all misses are fetched with a single IN (...) query.
+    """
+    found, missing = product_cache.get_many(product_ids)
+    if not missing:
+        return found
+
+    for product, version in db.execute(products_by_ids_statement(missing)):
+        payload = dump_json(jsonable_encoder(ProductResponse.model_validate(product)))
+        product_cache.put(product.id, version or 0, payload)
+        found[product.id] = payload
+    return found
+
+
+def get_product(db: Session, product_id: int) -> Optional[bytes]:
+    return get_products(db, [product_id]).get(product_id)
@@ -0,0 +1,237 @@
+"""
+Sampling profiler for requests.
+
+A sampler thread periodically reads the stacks of running threads
+(sys._current_frames) and the await chain of each profiled request's task,
+so a profile shows both where a request spent CPU and where it sat waiting:
+running on the event loop, running in a worker thread (sync endpoints run in
+the threadpool) or suspended on an awaitable. Nothing is hooked into the
+interpreter, so requests that are not being profiled pay nothing.
+
+Profiles are folded stacks, one "frame;frame;frame count" line per distinct
+stack: the input format of flamegraph.pl, inferno and speedscope.
+"""
+import asyncio
+import os
+import sys
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from types import FrameType
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import settings
+
+# Frame anyio's to_thread.run_sync waits in while a sync endpoint runs in a worker thread
+_WORKER_WAIT = "run_sync_in_worker_thread"
+
+Recorder = Callable[[dict, str], None]
+
+# Code objects of the frames profiles start below (the profiling middleware),
+# so stacks leave out the server and outer middleware frames
+STACK_ROOTS = set()
+
+
+def _label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _thread_stack(frame: Optional[FrameType]) -> List[FrameType]:
+    """A thread's frames, outermost first"""
+    stack = []
+    while frame is not None:
+        stack.append(frame)
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _below_root(frames: List[FrameType]) -> List[FrameType]:
+    for i in range(len(frames) - 1, -1, -1):
+        if frames[i].f_code in STACK_ROOTS:
+            return frames[i + 1:]
+    return frames
+
+
+def _await_chain(task: asyncio.Task) -> Tuple[List[FrameType], object]:
+    """Frames of the coroutines a task is awaiting through, outermost first, and what the innermost awaits"""
+    frames = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return frames, awaitable
+
+
+def sample_task(task: asyncio.Task, scope: dict, loop_thread: int, frames: Dict[int, FrameType]) -> Optional[str]:
+    """One folded stack for where `task` is right now, or None if it has finished"""
+    chain, awaitable = _await_chain(task)
+    if not chain:
+        return None
+
+    loop_stack = _thread_stack(frames.get(loop_thread))
+    root = chain[0]
+    for i, frame in enumerate(loop_stack):
+        if frame is root:
+            # Running on the event loop
+            return ";".join(_label(f) for f in _below_root(loop_stack[i:]))
+
+    labels = [_label(f) for f in _below_root(chain)]
+    endpoint = getattr(scope.get("endpoint"), "__code__", None)
+    if endpoint is not None and chain[-1].f_code.co_name == _WORKER_WAIT:
+        # Waiting for a sync endpoint: show the worker thread running it
+        for thread_id, frame in frames.items():
+            if thread_id == loop_thread:
+                continue
+            worker_stack = _thread_stack(frame)
+            for i, worker_frame in enumerate(worker_stack):
+                if worker_frame.f_code is endpoint:
+                    labels.append("[worker thread]")
+                    labels.extend(_label(f) for f in worker_stack[i:])
+                    return ";".join(labels)
+    # Futures are awaited through an iterator that doesn't expose them
+    kind = type(awaitable).__name__
+    labels.append("[await]" if kind in ("FutureIter", "NoneType") else f"[await {kind}]")
+    return ";".join(labels)
+
+
+class Profile:
+    """Sample counts per folded stack"""
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def add(self, stack: str):
+        with self._lock:
+            self.counts[stack] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+class Sampler(threading.Thread):
+    """
+    Samples registered tasks every `interval` seconds, passing each folded
+    stack to the task's recorder along with its ASGI scope.
+    """
+
+    def __init__(self, interval: float, loop_thread: int):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.loop_thread = loop_thread
+        self.targets: Dict[asyncio.Task, Tuple[dict, Recorder]] = {}
+        self._stopped = threading.Event()
+
+    def add(self, task: asyncio.Task, scope: dict, record: Recorder):
+        self.targets[task] = (scope, record)
+
+    def discard(self, task: asyncio.Task):
+        self.targets.pop(task, None)
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            targets = list(self.targets.items())
+            if not targets:
+                continue
+            frames = sys._current_frames()
+            try:
+                for task, (scope, record) in targets:
+                    stack = sample_task(task, scope, self.loop_thread, frames)
+                    if stack:
+                        record(scope, stack)
+            except Exception:
+                # A stack changed under us; drop this tick
+                pass
+            finally:
+                del frames
+
+    def stop(self):
+        self._stopped.set()
+        if self.is_alive():
+            self.join()
+
+
+class ProfileStore:
+    """The most recent per-request profiles, by request ID"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._profiles: "OrderedDict[str, Tuple[dict, Profile]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, profile_id: str, info: dict, profile: Profile):
+        with self._lock:
+            self._profiles[profile_id] = (info, profile)
+            self._profiles.move_to_end(profile_id)
+            while len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Tuple[dict, Profile]]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> List[dict]:
+        with self._lock:
+            return [info for info, _ in reversed(self._profiles.values())]
+
+
+def route_of(scope: dict) -> str:
+    """Route template a request matched, e.g. /api/products/{product_id}"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "<unmatched>"
+
+
+class RouteProfiler:
+    """Low-rate background sampling of every request, aggregated per route"""
+
+    def __init__(self):
+        self.sampler: Optional[Sampler] = None
+        self.started_at: Optional[str] = None
+        self.profiles: Dict[str, Profile] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.sampler is not None
+
+    def start(self, interval: float):
+        """Start sampling; call from the event loop thread"""
+        if self.sampler is not None:
+            return
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.sampler = Sampler(interval, threading.get_ident())
+        self.sampler.start()
+
+    def stop(self):
+        if self.sampler is not None:
+            self.sampler.stop()
+            self.sampler = None
+
+    def record(self, scope: dict, stack: str):
+        route = route_of(scope)
+        with self._lock:
+            profile = self.profiles.get(route)
+            if profile is None:
+                profile = self.profiles[route] = Profile()
+        profile.add(stack)
+
+    def summary(self) -> dict:
+        with self._lock:
+            profiles = dict(self.profiles)
+        return {
+            "active": self.active,
+            "started_at": self.started_at,
+            "routes": {route: profile.samples for route, profile in sorted(profiles.items())},
+        }
+
+
+profile_store = ProfileStore(settings.PROFILE_STORE_SIZE)
+route_profiler = RouteProfiler()
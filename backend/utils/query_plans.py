@@ -0,0 +1,260 @@
+"""
+EXPLAIN checks for every query shape the routes issue.
+
+Run `python -m utils.query_plans` (optionally with `--database-url`) to build
+the schema in a scratch database, EXPLAIN each registered shape and exit
+non-zero if any of them needs a full table scan or a sort the index should
+have provided. New queries in routes should be registered here with
+`@query_shape`.
+
+SQLite's planner decides from the available indexes alone, which makes it a
+stable CI check. MySQL's optimizer also weighs table statistics and will
+happily scan a near-empty table, so point it at a database with
+representative data when checking there.
+"""
+import argparse
+import re
+import sys
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from sqlalchemy import create_engine, select, update, delete, func
+from sqlalchemy.engine import Engine
+
+from database import Base
+from models.user import User
+from models.product import Product
+from models.otp import OTP
+from models.catalog import CatalogState, CATALOG_STATE_ID
+from models.revoked_token import RevokedToken
+from models.facet import CategoryFacet
+from models.review import Review
+from models.catalog_event import CatalogEvent
+from utils.product_cache import products_by_ids_statement
+
+# name -> factory returning the statement to EXPLAIN
+QUERY_SHAPES: Dict[str, Callable] = {}
+
+
+def query_shape(name: str):
+    """Register a statement factory under `name`"""
+    def decorator(factory: Callable):
+        QUERY_SHAPES[name] = factory
+        return factory
+    return decorator
+
+
+# --- Authentication ---------------------------------------------------------
+
+@query_shape("user_by_email")
+def _user_by_email():
+    return select(User).where(User.email == "a@example.com").limit(1)
+
+
+@query_shape("user_by_id")
+def _user_by_id():
+    return select(User).where(User.id == 1)
+
+
+@query_shape("user_by_google_id_or_email")
+def _user_by_google_id_or_email():
+    return select(User).where((User.google_id == "g") | (User.email == "a@example.com")).limit(1)
+
+
+@query_shape("otp_invalidate_unused")
+def _otp_invalidate_unused():
+    return update(OTP).where(OTP.user_id == 1, OTP.used == False).values(used=True)  # noqa: E712
+
+
+@query_shape("otp_verify")
+def _otp_verify():
+    return select(OTP).where(
+        OTP.user_id == 1,
+        OTP.code == "123456",
+        OTP.used == False,  # noqa: E712
+        OTP.expires_at > datetime.utcnow(),
+    ).limit(1)
+
+
+@query_shape("otp_purge_batch")
+def _otp_purge_batch():
+    return select(OTP.id).where(OTP.expires_at < datetime.utcnow()).order_by(OTP.expires_at).limit(500)
+
+
+@query_shape("revoked_tokens_purge")
+def _revoked_tokens_purge():
+    return delete(RevokedToken).where(RevokedToken.expires_at <= datetime.utcnow())
+
+
+# --- Products ---------------------------------------------------------------
+
+@query_shape("catalog_version")
+def _catalog_version():
+    return select(CatalogState).where(CatalogState.id == CATALOG_STATE_ID)
+
+
+@query_shape("marketplace_listing")
+def _marketplace_listing():
+    return select(Product).order_by(Product.created_at.desc(), Product.id.desc())
+
+
+@query_shape("my_products")
+def _my_products():
+    return select(Product).where(Product.created_by == 1)
+
+
+@query_shape("category_price_bounds")
+def _category_price_bounds():
+    return select(func.min(Product.price), func.max(Product.price)).where(Product.category == "Tools")
+
+
+@query_shape("category_facet_for_update")
+def _category_facet_for_update():
+    return select(CategoryFacet).where(CategoryFacet.category == "Tools")
+
+
+@query_shape("facets_listing")
+def _facets_listing():
+    return select(CategoryFacet).order_by(CategoryFacet.category)
+
+
+@query_shape("active_deals")
+def _active_deals():
+    return select(Product).where(Product.deal_ends_at > datetime.utcnow()).order_by(Product.deal_ends_at)
+
+
+@query_shape("pending_deal_expiries")
+def _pending_deal_expiries():
+    return select(Product.deal_ends_at, Product.id).where(
+        Product.deal_ends_at.isnot(None)
+    ).order_by(Product.deal_ends_at)
+
+
+@query_shape("expire_deals")
+def _expire_deals():
+    return select(Product).where(Product.id.in_([1, 2, 3]), Product.deal_ends_at <= datetime.utcnow())
+
+
+@query_shape("product_by_id")
+def _product_by_id():
+    return select(Product).where(Product.id == 1).limit(1)
+
+
+@query_shape("products_by_ids")
+def _products_by_ids():
+    return products_by_ids_statement([1, 2, 3])
+
+
+# --- Reviews ----------------------------------------------------------------
+
+@query_shape("reviews_page")
+def _reviews_page():
+    return select(Review).where(Review.product_id == 1, Review.id < 100).order_by(Review.id.desc()).limit(21)
+
+
+@query_shape("review_by_id_for_product")
+def _review_by_id_for_product():
+    return select(Review).where(Review.id == 1, Review.product_id == 1).limit(1)
+
+
+@query_shape("rating_recompute_products")
+def _rating_recompute_products():
+    return select(Product.id).where(Product.id > 0).order_by(Product.id).limit(500)
+
+
+@query_shape("rating_recompute_totals")
+def _rating_recompute_totals():
+    return select(Review.product_id, func.count(Review.id), func.sum(Review.rating)).where(
+        Review.product_id.in_([1, 2, 3])
+    ).group_by(Review.product_id)
+
+
+# --- Catalog events ---------------------------------------------------------
+
+@query_shape("catalog_events_since")
+def _catalog_events_since():
+    return select(CatalogEvent.id, CatalogEvent.event_type, CatalogEvent.data).where(
+        CatalogEvent.id > 100
+    ).order_by(CatalogEvent.id).limit(1000)
+
+
+@query_shape("catalog_events_recent")
+def _catalog_events_recent():
+    return select(CatalogEvent.id, CatalogEvent.event_type, CatalogEvent.data).where(
+        CatalogEvent.id > 100
+    ).order_by(CatalogEvent.id)
+
+
+@query_shape("catalog_events_purge")
+def _catalog_events_purge():
+    return delete(CatalogEvent).where(CatalogEvent.created_at < datetime.utcnow())
+
+
+# --- Plan inspection --------------------------------------------------------
+
+_SQLITE_FULL_SCAN = re.compile(r"^SCAN (TABLE )?\w+$")
+
+
+def explain(engine: Engine, statement) -> List[str]:
+    """Return a list of problems with the statement's plan (empty if it is fine)"""
+    # Expand IN (...) lists so the SQL can be sent as-is
+    compiled = statement.compile(dialect=engine.dialect, compile_kwargs={"render_postcompile": True})
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+
+    problems = []
+    with engine.connect() as connection:
+        if engine.dialect.name == "sqlite":
+            rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+            for row in rows:
+                detail = row[-1]
+                if _SQLITE_FULL_SCAN.match(detail):
+                    problems.append(f"full table scan ({detail})")
+                elif "USE TEMP B-TREE" in detail:
+                    problems.append(f"sort without index ({detail})")
+        elif engine.dialect.name == "mysql":
+            result = connection.exec_driver_sql(f"EXPLAIN {compiled}", params)
+            for row in result.mappings():
+                if row.get("type") == "ALL":
+                    problems.append(f"full table scan on {row.get('table')}")
+                if "filesort" in (row.get("Extra") or ""):
+                    problems.append(f"filesort on {row.get('table')}")
+        else:
+            raise RuntimeError(f"EXPLAIN checks are not implemented for {engine.dialect.name}")
+    return problems
+
+
+def check_query_plans(engine: Engine) -> Dict[str, List[str]]:
+    """EXPLAIN every registered shape and return {name: problems} for the failures"""
+    failures = {}
+    for name, factory in QUERY_SHAPES.items():
+        problems = explain(engine, factory())
+        if problems:
+            failures[name] = problems
+    return failures
+
+
+def main(argv=None) -> int:
+    from migrations import run_migrations
+
+    parser = argparse.ArgumentParser(description="Fail if any route query shape needs a full table scan")
+    parser.add_argument("--database-url", default="sqlite://", help="Database to check (default: in-memory SQLite)")
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.database_url)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    failures = check_query_plans(engine)
+    for name in QUERY_SHAPES:
+        status = "FAIL" if name in failures else "ok"
+        print(f"{status:4}  {name}")
+        for problem in failures.get(name, []):
+            print(f"      - {problem}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from config import settings
+from database import SessionLocal, engine
+from models.product import Product
+from models.review import Review
+from utils.catalog_events import publish_product_event, PRODUCT_UPDATED
+from utils.locks import try_advisory_lock
+
+logger = logging.getLogger(__name__)
+
+# Rating shown for products nobody has reviewed yet
+DEFAULT_RATING = 5.0
+
+
+def _set_rating(product: Product):
+    product.rating = (
+        round(product.rating_total / product.review_count, 2)
+        if product.review_count else DEFAULT_RATING
+    )
+
+
+def lock_product(db: Session, product_id: int) -> Optional[Product]:
+    """Fetch a product FOR UPDATE so concurrent reviews apply one at a time"""
+    return db.query(Product).filter(Product.id == product_id).with_for_update().first()
+
+
+def apply_review_added(product: Product, rating: int):
+    """O(1) running-sum update; call inside the review's transaction"""
+    product.review_count = (product.review_count or 0) + 1
+    product.rating_total = (product.rating_total or 0) + rating
+    _set_rating(product)
+
+
+def apply_review_changed(product: Product, old_rating: int, new_rating: int):
+    product.rating_total = (product.rating_total or 0) + new_rating - old_rating
+    _set_rating(product)
+
+
+def apply_review_removed(product: Product, rating: int):
+    product.review_count = max((product.review_count or 0) - 1, 0)
+    product.rating_total = (product.rating_total or 0) - rating if product.review_count else 0
+    _set_rating(product)
+
+
+def recompute_ratings(db: Session, after_id: int, batch_size: int) -> Optional[int]:
+    """
+    Recompute count/total/rating from `reviews` for one batch of products
+    with id > after_id. Returns the last product id processed, or None when
+    there are no more products.
+    """
+    product_ids = [
+        product_id for (product_id,) in db.query(Product.id)
+        .filter(Product.id > after_id)
+        .order_by(Product.id)
+        .limit(batch_size)
+    ]
+    if not product_ids:
+        return None
+
+    totals = {
+        product_id: (count, total)
+        for product_id, count, total in db.query(
+            Review.product_id, func.count(Review.id), func.sum(Review.rating)
+        ).filter(Review.product_id.in_(product_ids)).group_by(Review.product_id)
+    }
+
+    for product in db.query(Product).filter(Product.id.in_(product_ids)).with_for_update():
+        count, total = totals.get(product.id, (0, 0))
+        if (product.review_count, product.rating_total) != (count, float(total or 0)):
+            product.review_count = count
+            product.rating_total = float(total or 0)
+            _set_rating(product)
+            publish_product_event(db, PRODUCT_UPDATED, product)
+    db.commit()
+    return product_ids[-1]
+
+
+def run_rating_recompute() -> int:
+    """Walk every product in batches, correcting any drift in the running sums"""
+    with try_advisory_lock(engine, "rating_recompute") as acquired:
+        if not acquired:
+            return 0
+        db = SessionLocal()
+        processed = 0
+        last_id = 0
+        try:
+            while True:
+                next_id = recompute_ratings(db, last_id, settings.RATING_RECOMPUTE_BATCH_SIZE)
+                if next_id is None:
+                    break
+                processed += 1
+                last_id = next_id
+                time.sleep(settings.RATING_RECOMPUTE_BATCH_PAUSE_MS / 1000)
+        finally:
+            db.close()
+        return processed
+
+
+async def rating_recompute_task():
+    """Background task that re-derives product ratings from reviews"""
+    while True:
+        await asyncio.sleep(settings.RATING_RECOMPUTE_INTERVAL_HOURS * 3600)
+        try:
+            started = time.perf_counter()
+            batches = await asyncio.to_thread(run_rating_recompute)
+            if batches:
+                logger.info("Recomputed ratings in %d batches in %.2f s", batches, time.perf_counter() - started)
+        except Exception:
+            logger.exception("Rating recompute failed")
@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from jose import JWTError, jwk, jwt
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from config import settings
+from database import SessionLocal, engine
+from models.revoked_token import RevokedToken
+from utils.locks import try_advisory_lock
+
+logger = logging.getLogger(__name__)
+
+# Key ID used for tokens signed with the shared SECRET_KEY
+SHARED_SECRET_KID = "hs"
+
+
+@dataclass(frozen=True)
+class TokenPrincipal:
+    """Identity carried by an access token, available without a DB lookup"""
+    id: Optional[int]
+    email: str
+    auth_provider: Optional[str]
+    jti: Optional[str]
+    expires_at: Optional[datetime]
+
+
+class KeySet:
+    """
+    Signing and verification keys, parsed once and cached.
+
+    With JWT_KEYS_DIR unset, tokens are signed with SECRET_KEY (HS256). With it
+    set, every `<kid>.pem` private key in the directory can verify tokens and
+    JWT_ACTIVE_KID (or the newest file) signs new ones. Rotating keys is a matter
+    of adding a file; the directory is re-read when its mtime changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._dir_mtime = None
+        self._signing: Tuple[str, object] = (SHARED_SECRET_KID, None)
+        self._verifying: Dict[str, object] = {}
+
+    def _load(self):
+        if not settings.JWT_KEYS_DIR:
+            key = jwk.construct(settings.SECRET_KEY, settings.ALGORITHM)
+            self._signing = (SHARED_SECRET_KID, key)
+            self._verifying = {SHARED_SECRET_KID: key}
+            return
+
+        keys_dir = Path(settings.JWT_KEYS_DIR)
+        key_files = sorted(keys_dir.glob("*.pem"), key=lambda p: p.stat().st_mtime)
+        if not key_files:
+            raise RuntimeError(f"No *.pem keys found in {keys_dir}")
+
+        signing_keys = {}
+        verifying = {}
+        for key_file in key_files:
+            private_key = jwk.construct(key_file.read_text(), settings.ALGORITHM)
+            signing_keys[key_file.stem] = private_key
+            verifying[key_file.stem] = private_key.public_key()
+
+        active_kid = settings.JWT_ACTIVE_KID or key_files[-1].stem
+        if active_kid not in signing_keys:
+            raise RuntimeError(f"Active JWT key '{active_kid}' not found in {keys_dir}")
+        self._signing = (active_kid, signing_keys[active_kid])
+        self._verifying = verifying
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._verifying and now - self._checked_at < settings.JWT_KEYSET_REFRESH_SECONDS:
+            return
+        with self._lock:
+            if self._verifying and now - self._checked_at < settings.JWT_KEYSET_REFRESH_SECONDS:
+                return
+            dir_mtime = os.stat(settings.JWT_KEYS_DIR).st_mtime if settings.JWT_KEYS_DIR else None
+            if not self._verifying or dir_mtime != self._dir_mtime:
+                self._load()
+                self._dir_mtime = dir_mtime
+            self._checked_at = now
+
+    def signing_key(self) -> Tuple[str, object]:
+        self._refresh()
+        return self._signing
+
+    def verifying_key(self, kid: Optional[str]) -> Optional[object]:
+        self._refresh()
+        # Tokens issued before key IDs existed were signed with the shared secret
+        return self._verifying.get(kid or SHARED_SECRET_KID)
+
+
+def _utc_timestamp(value: datetime) -> float:
+    # Naive datetimes in this codebase are UTC (datetime.utcnow())
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class RevocationList:
+    """
+    In-memory set of revoked token IDs with their expiry, so checks are O(1).
+    Revocations are persisted in `revoked_tokens` and every worker reloads them
+    periodically; entries drop out once the token would have expired anyway.
+    """
+
+    def __init__(self):
+        self._revoked: Dict[str, float] = {}
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        if not jti:
+            return False
+        expires = self._revoked.get(jti)
+        return expires is not None and expires > time.time()
+
+    def add(self, jti: str, expires_at: datetime):
+        self._revoked[jti] = _utc_timestamp(expires_at)
+
+    def revoke(self, db: Session, jti: str, expires_at: datetime):
+        """Persist a revocation and apply it to this worker immediately"""
+        db.add(RevokedToken(jti=jti, expires_at=expires_at))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Already revoked (the same token logged out twice, possibly concurrently)
+            db.rollback()
+        self.add(jti, expires_at)
+
+    def reload(self, db: Session):
+        """Replace the in-memory set with the unexpired revocations (read-only)"""
+        rows = db.query(RevokedToken.jti, RevokedToken.expires_at).filter(
+            RevokedToken.expires_at > datetime.utcnow()
+        ).all()
+        self._revoked = {jti: _utc_timestamp(expires_at) for jti, expires_at in rows}
+
+
+class DecodedTokenCache:
+    """LRU cache of verified token claims, so hot tokens skip signature checks"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[dict]:
+        with self._lock:
+            claims = self._entries.get(token)
+            if claims is None:
+                return None
+            if claims["exp"] <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return claims
+
+    def put(self, token: str, claims: dict):
+        with self._lock:
+            self._entries[token] = claims
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+key_set = KeySet()
+revocation_list = RevocationList()
+token_cache = DecodedTokenCache(settings.TOKEN_CACHE_SIZE)
+
+
+def encode_token(claims: dict, expires_delta: Optional[timedelta] = None) -> str:
+    """Sign an access token, adding exp, iat and a unique jti"""
+    now = datetime.utcnow()
+    expire = now + (expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES))
+    to_encode = claims.copy()
+    to_encode.update({"exp": expire, "iat": now, "jti": uuid.uuid4().hex})
+    kid, key = key_set.signing_key()
+    return jwt.encode(to_encode, key, algorithm=settings.ALGORITHM, headers={"kid": kid})
+
+
+def decode_token(token: str) -> dict:
+    """Verify a token (or fetch it from the cache) and return its claims"""
+    claims = token_cache.get(token)
+    if claims is None:
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = key_set.verifying_key(kid)
+        if key is None:
+            raise JWTError("Unknown signing key")
+        claims = jwt.decode(token, key, algorithms=[settings.ALGORITHM])
+        token_cache.put(token, claims)
+
+    if revocation_list.is_revoked(claims.get("jti")):
+        raise JWTError("Token has been revoked")
+    return claims
+
+
+def principal_from_claims(claims: dict) -> TokenPrincipal:
+    return TokenPrincipal(
+        id=claims.get("uid"),
+        email=claims["sub"],
+        auth_provider=claims.get("prv"),
+        jti=claims.get("jti"),
+        expires_at=datetime.utcfromtimestamp(claims["exp"]) if "exp" in claims else None,
+    )
+
+
+async def revocation_refresh_task():
+    """
+    Background task that keeps this worker's revocation list current, and
+    every REVOCATION_PURGE_INTERVAL_MINUTES purges expired revocations
+    """
+    interval = settings.REVOCATION_REFRESH_SECONDS
+    purge_every = max(settings.REVOCATION_PURGE_INTERVAL_MINUTES * 60 // interval, 1)
+    refreshes = 0
+    while True:
+        try:
+            await asyncio.to_thread(_reload_revocations)
+        except Exception:
+            logger.exception("Failed to reload revocation list")
+        refreshes += 1
+        if refreshes % purge_every == 0:
+            try:
+                await asyncio.to_thread(purge_revocations)
+            except Exception:
+                logger.exception("Revocation purge failed")
+        await asyncio.sleep(interval)
+
+
+def _reload_revocations():
+    db = SessionLocal()
+    try:
+        revocation_list.reload(db)
+    finally:
+        db.close()
+
+
+def purge_revocations() -> int:
+    """Delete revocations of tokens that have expired; only one process runs it at a time"""
+    with try_advisory_lock(engine, "revoked_tokens_purge") as acquired:
+        if not acquired:
+            return 0
+        db = SessionLocal()
+        try:
+            purged = db.query(RevokedToken).filter(
+                RevokedToken.expires_at <= datetime.utcnow()
+            ).delete(synchronize_session=False)
+            db.commit()
+            return purged
+        finally:
+            db.close()
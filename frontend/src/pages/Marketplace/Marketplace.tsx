@@ -248,7 +248,7 @@ export const Marketplace = () => {
                             <Box sx={{ position: 'relative' }}>
                                 <Box
                                     component="img"
-                                    src={product.image || 'https://images.unsplash.com/photo-1557821552-17105176677c?w=400&h=200&fit=crop'}
+                                    src={productService.thumbnailUrl(product)}
                                     alt={product.name}
                                     sx={{
                                         width: '100%',
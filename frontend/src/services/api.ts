@@ -18,8 +18,27 @@ const api = axios.create({
     },
 });
 
-// Add token to requests if available
+// Writes return the time they were made in X-Last-Write. Sending it back on
+// later requests makes the backend read from the primary database until its
+// read replicas have caught up, so we always see our own writes.
+const LAST_WRITE_KEY = 'last-write';
+const LAST_WRITE_ECHO_MS = 60 * 1000;
+
+api.interceptors.response.use((response) => {
+    const lastWrite = response.headers['x-last-write'];
+    if (lastWrite) {
+        localStorage.setItem(LAST_WRITE_KEY, lastWrite);
+    }
+    return response;
+});
+
+// Echo our last write, and add token to requests if available
 api.interceptors.request.use((config) => {
+    const lastWrite = localStorage.getItem(LAST_WRITE_KEY);
+    if (lastWrite && Date.now() - Number(lastWrite) < LAST_WRITE_ECHO_MS) {
+        config.headers['X-Last-Write'] = lastWrite;
+    }
+
     const token = localStorage.getItem('auth-storage');
     if (token) {
         try {
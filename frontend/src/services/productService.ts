@@ -13,6 +13,7 @@ export interface Product {
     image: string | null;
     badge: string | null;
     deal_ends: string | null;
+    deal_ends_at: string | null; // ISO 8601 in UTC
     created_by: number;
     created_at: string;
     updated_at: string | null;
@@ -28,15 +29,38 @@ export interface ProductCreate {
     image?: string;
     badge?: string;
     deal_ends?: string;
+    deal_ends_at?: string;
 }
 
+export type ThumbnailSize = 'small' | 'card' | 'large';
+
 export const productService = {
+    // URL of a product's image thumbnail, served through the backend's image proxy
+    thumbnailUrl: (product: Product, size: ThumbnailSize = 'card'): string => {
+        const version = encodeURIComponent(product.updated_at ?? product.created_at);
+        return `${api.defaults.baseURL}/api/products/${product.id}/image?size=${size}&v=${version}`;
+    },
+
     // Get all products (for marketplace)
     getAll: async (): Promise<Product[]> => {
         const response = await api.get<Product[]>('/api/products');
         return response.data;
     },
 
+    // Get a single product
+    getById: async (productId: number): Promise<Product> => {
+        const response = await api.get<Product>(`/api/products/${productId}`);
+        return response.data;
+    },
+
+    // Get several products by ID, in the order given (unknown IDs are skipped)
+    getByIds: async (productIds: number[]): Promise<Product[]> => {
+        const response = await api.get<Product[]>('/api/products', {
+            params: { ids: productIds.join(',') },
+        });
+        return response.data;
+    },
+
     // Get current user's products
     getMy: async (): Promise<Product[]> => {
         const response = await api.get<Product[]>('/api/products/my');